@@ -1,144 +1,231 @@
-import asyncio
-import base64
 import os
-import functools
-from functools import lru_cache
+import time
 
-import PyPDF2
 import streamlit as st
-from langdetect import detect
 
 from utils.init import initialize
 from utils.counter import initialize_user_count, increment_user_count, get_user_count
-from utils.TelegramSender import TelegramSender
-from utils.tts_pyttsx3_converter import Pyttsx3TextToSpeechConverter
-from utils.tts_gtts_converter import gTTSTextToSpeechConverter
+from utils.audio_cache import AudioCache
+from utils.extraction_cache import ExtractionCache
+from utils.pdf_extractor import extract_pages_from_pdf
+from utils.language_detection import detect_language
+from utils.chunker import ENGINE_MAX_BYTES
+from utils.dedup import MIN_SHARED_BLOCK_CHARS, dedup_report, split_pages, split_repeated_segments
+from utils.TelegramSender import TelegramSender, TelegramUploadQueue
+from utils.conversion_service import AUDIO_OUTPUT_DIR, ConversionService, segment_path
+from utils.job_queue import DONE, FAILED
+from utils.prefetch import PagePrefetcher
+from utils.metrics import start_exporters_from_env
+from utils.runtime import get_runtime
+from utils.tools import spool_upload
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def clean_text(input_text):
-    # Split the text into lines
-    lines = input_text.split('\n')
-    
-    # Process each line
-    cleaned_lines = []
-    for line in lines:
-        # Remove spaces between characters and strip leading/trailing spaces
-        cleaned_line = ''.join(line.split()).strip()
-        if cleaned_line:  # Only add non-empty lines
-            cleaned_lines.append(cleaned_line)
-    
-    # Join the cleaned lines back together
-    return ' '.join(cleaned_lines)
-
-def async_lru_cache(maxsize=128, typed=False):
-    def decorator(func):
-        sync_func = functools.lru_cache(maxsize=maxsize, typed=typed)(func)
-        @functools.wraps(func)
-        async def wrapper(*args, **kwargs):
-            return await sync_func(*args, **kwargs)
-        return wrapper
-    return decorator
-
-@async_lru_cache(maxsize=100)
-async def cached_text_to_speech(text, language):
-    print(f"text_to_speech: language={language}")
+# Uploads are spooled to disk and parsed from a memory map, so size is bounded by disk, not
+# memory; keep in step with server.maxUploadSize in .streamlit/config.toml
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+
+# Finished audio is served by Streamlit's static file server (see .streamlit/config.toml),
+# which streams it from disk with byte-range support instead of inlining it in the page.
+AUDIO_OUTPUT_URL = "app/static/audio"
+AUDIO_OUTPUT_TTL_SECONDS = 60 * 60
+os.makedirs(AUDIO_OUTPUT_DIR, exist_ok=True)
+
+# Shared by every session and worker process; entries are keyed by chunk content
+AUDIO_CACHE = AudioCache()
+# Per-page text and language by PDF hash, so a repeated upload is not parsed again
+EXTRACTION_CACHE = ExtractionCache()
+
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", "2"))
+JOB_POLL_INTERVAL = 0.5
+
+@st.cache_resource
+def get_conversion_service():
+    # One worker pool per server process, shared by every session
+    return ConversionService(output_dir=AUDIO_OUTPUT_DIR, audio_cache=AUDIO_CACHE).start(workers=CONVERSION_WORKERS)
+
+def wait_for_conversion_job(pdf_hash, text, language, progress_bar, status_text, segment_callback=None, page_offsets=None):
+    """Submit the document to the background queue and follow it until the audio is ready."""
+    job_id = get_conversion_service().queue.submit(pdf_hash, language, text, page_offsets=page_offsets)
+    return follow_conversion_job(job_id, progress_bar, status_text, segment_callback)
+
+def follow_conversion_job(job_id, progress_bar, status_text, segment_callback=None):
+    queue = get_conversion_service().queue
+    shown_segments = 0
+    while True:
+        job = queue.get(job_id)
+        if job['message']:
+            status_text.text(job['message'])
+        progress_bar.progress(min(job['progress'], 1.0))
+        if segment_callback:
+            while shown_segments < job['segments']:
+                segment_callback(shown_segments, job['total_segments'], segment_path(AUDIO_OUTPUT_DIR, job_id, shown_segments))
+                shown_segments += 1
+        if job['status'] == DONE:
+            return job['result_path'], job['conversion_time']
+        if job['status'] == FAILED:
+            raise Exception(job['error'])
+        time.sleep(JOB_POLL_INTERVAL)
+
+def tts_language(language):
+    if language == 'he' or language == 'iw':
+        return 'iw'  # gTTS uses 'iw' for Hebrew
+    raise ValueError("רק קובצי PDF עבריים נתמכים. זוהתה שפה לא נתמכת.")
+
+def convert_document(text, language, pdf_hash, segment_callback=None, page_offsets=None):
+    """Convert the document on the background queue, showing its progress until it is done."""
+    print(f"convert_document: language={language}")
+    language = tts_language(language)
     progress_bar = st.progress(0)
     status_text = st.empty()
 
-    async def update_status(status, progress):
-        status_text.text(status)
-        progress_bar.progress(progress)
-
-    if language == 'he' or language == 'iw':        
-        language = 'iw'  # gTTS uses 'iw' for Hebrew
-        converter = gTTSTextToSpeechConverter()  
-        result = await converter.text_to_speech(text, language, status_callback=update_status)
-    else:
-        raise ValueError("רק קובצי PDF עבריים נתמכים. זוהתה שפה לא נתמכת.")
-
-
-    # if language == 'he' or language == 'iw':
-    #     print("text_to_speech: language=hebrew")
-    #     language = 'iw'  # gTTS uses 'iw' for Hebrew
-    #     converter = gTTSTextToSpeechConverter()   
-    # else:
-    #     print(f"text_to_speech: language={language}")
-    #     if not language.startswith('en'):
-    #         text=clean_text(text)
-        
-    #     converter = Pyttsx3TextToSpeechConverter()
+    result = wait_for_conversion_job(pdf_hash, text, language, progress_bar, status_text, segment_callback, page_offsets)
 
-    
-    
     progress_bar.empty()
     status_text.empty()
     
     return result
 
-async def extract_text_from_pdf(file):
-    text = ""
-    pdf_reader = PyPDF2.PdfReader(file)
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
-
-def detect_language(text):
-    try:
-        return detect(text)
-    except:
-        return 'en'
+def get_audio_url(audio_file_path):
+    return f"{AUDIO_OUTPUT_URL}/{os.path.basename(audio_file_path)}"
 
 def get_binary_file_downloader_html(bin_file, file_label='קובץ'):
-    with open(bin_file, 'rb') as f:
-        data = f.read()
-    bin_str = base64.b64encode(data).decode()
-    href = f'data:application/octet-stream;base64,{bin_str}'
+    href = get_audio_url(bin_file)
     return f'<a href="{href}" download="{os.path.basename(bin_file)}" class="download-button">לחיצה להורדת {file_label}</a>'
 
+def cleanup_expired_audio(max_age=AUDIO_OUTPUT_TTL_SECONDS):
+    """Served audio has to outlive the script run that produced it, so it is removed by age instead."""
+    now = time.time()
+    for entry in os.scandir(AUDIO_OUTPUT_DIR):
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
 def format_conversion_time(total_seconds):
     minutes, seconds = divmod(int(total_seconds), 60)
     if minutes > 0:
         return f"{minutes} דקות ו-{seconds} שניות" if seconds > 0 else f"{minutes} דקות"
+    if total_seconds < 10:
+        return f"{total_seconds:.1f} שניות"
     return f"{seconds} שניות"
 
 
-async def process_file(file, original_filename):
-    text = await extract_text_from_pdf(file)
+def play_page_by_page(document):
+    """Player for on-demand mode: only the chosen page and the few after it are synthesized."""
+    prefetcher = PagePrefetcher(get_conversion_service().queue, document['pdf_hash'], document['language'], document['pages'])
+    page = st.number_input(f"עמוד להאזנה (מתוך {prefetcher.page_count})", min_value=1, max_value=prefetcher.page_count, value=1, step=1)
+    job_id = prefetcher.request(page - 1)
+    if job_id is None:
+        st.info("אין טקסט להקראה בעמוד זה")
+        return
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    audio_file_path, _ = follow_conversion_job(job_id, progress_bar, status_text)
+    progress_bar.empty()
+    status_text.empty()
+    st.audio(get_audio_url(audio_file_path), format='audio/mp3', autoplay=True)
+    last_ready = min(page + prefetcher.read_ahead, prefetcher.page_count)
+    if last_ready > page:
+        st.caption(f"עמודים {page + 1}-{last_ready} מוכנים ברקע")
+
+def extract_document(file):
+    """Return (pdf_hash, pages, language), from the extraction cache when this PDF was seen before."""
+    pdf_path, pdf_hash = spool_upload(file, UPLOAD_DIR)
+    try:
+        cached = EXTRACTION_CACHE.get(pdf_hash)
+        if cached is not None:
+            pages, language = cached
+            return pdf_hash, pages, language
+        # Extraction runs on the process-wide loop and its shared executors, not a per-rerun one
+        pages = get_runtime().run(extract_pages_from_pdf(pdf_path))
+    finally:
+        os.remove(pdf_path)
+    language = detect_language("\n".join(pages), cache_key=pdf_hash)
+    EXTRACTION_CACHE.put(pdf_hash, pages, language)
+    return pdf_hash, pages, language
+
+def process_file(file, original_filename, drop_boilerplate=False, on_demand=False):
+    pdf_hash, pages, detected_lang = extract_document(file)
+    text = "\n".join(pages)
     st.text_area("טקסט שחולץ", text, height=300, key="extracted_text")
     
-    detected_lang = detect_language(text)
     st.info(f"שפה שזוהתה: {detected_lang}")
+
+    # Repeated headers, footers and disclaimers are synthesized once, or dropped on request
+    speech_text, page_offsets = split_repeated_segments(pages, drop_boilerplate=drop_boilerplate, with_page_offsets=True)
+    report = dedup_report(pages, speech_text, ENGINE_MAX_BYTES["gtts"])
+    print(f"Dedup report for {original_filename}: {report}")
+    if report['requests_saved'] or report['chars_saved']:
+        # Sharing a block adds chunk boundaries, so requests can go up while characters go down
+        st.info(f"טקסט חוזר: נחסכו {report['chars_saved']:,} תווים, {report['requests']} בקשות המרה במקום {report['original_requests']}")
     
+    cleanup_expired_audio()
+
+    # Segments are playable as soon as they are synthesized, in document order
+    playlist = st.container()
+    start_time = time.time()
+    timings = {}
+    if drop_boilerplate:
+        pdf_hash = f"{pdf_hash}:no-boilerplate"
+
+    if on_demand:
+        # Kept for the reruns that follow as the listener moves between pages
+        try:
+            st.session_state.on_demand_document = {
+                'file_id': file.file_id,
+                'pdf_hash': pdf_hash,
+                'language': tts_language(detected_lang),
+                'pages': split_pages(speech_text, page_offsets),
+            }
+        except ValueError as e:
+            st.error(str(e))
+        return
+
+    def play_segment(index, total, segment_path):
+        if 'first_audio' not in timings:
+            timings['first_audio'] = time.time() - start_time
+            playlist.markdown("**ניתן להתחיל להאזין בזמן שההמרה נמשכת:**")
+        playlist.caption(f"חלק {index + 1} מתוך {total}")
+        playlist.audio(get_audio_url(segment_path), format='audio/mp3')
+
     try:
         with st.spinner("ממיר טקסט לדיבור... זה עשוי לקחת מספר רגעים."):
-            audio_file_path, conversion_time = await cached_text_to_speech(text, detected_lang)
+            audio_file_path, conversion_time = convert_document(speech_text, detected_lang, pdf_hash, segment_callback=play_segment, page_offsets=page_offsets)
             formatted_time = format_conversion_time(conversion_time)
-            st.success(f"ההמרה הושלמה ב-{formatted_time}")
+            if 'first_audio' in timings:
+                first_audio_time = format_conversion_time(timings['first_audio'])
+                st.success(f"ההמרה הושלמה ב-{formatted_time} (האודיו הראשון היה זמין אחרי {first_audio_time})")
+            else:
+                st.success(f"ההמרה הושלמה ב-{formatted_time}")
         
-        with open(audio_file_path, 'rb') as audio_file:
-            st.audio(audio_file.read(), format='audio/mp3')
+        st.audio(get_audio_url(audio_file_path), format='audio/mp3')
         
         st.markdown(get_binary_file_downloader_html(audio_file_path, 'אודיו'), unsafe_allow_html=True)
         
-        await send_telegram_message_and_file(f"PDF2VOICE: {original_filename}", audio_file_path)
+        send_telegram_message_and_file(f"PDF2VOICE: {original_filename}", audio_file_path)
     except ValueError as e:
         st.error(str(e))
-    finally:
-        # Delete the file after sending and displaying
-        if os.path.exists(audio_file_path):
-            os.remove(audio_file_path)
-            print(f"Deleted temporary file: {audio_file_path}")
 
-async def send_telegram_message_and_file(message, file_path):
-    sender = st.session_state.telegram_sender
-    try:
-        await sender.send_document(file_path, message)
-    finally:
-        await sender.close_session()
+@st.cache_resource
+def start_metrics_exporters():
+    # Prometheus endpoint (METRICS_PORT) and/or JSON file (METRICS_JSON_FILE), once per process
+    return start_exporters_from_env()
 
-async def main():
+@st.cache_resource
+def get_telegram_upload_queue():
+    # One upload queue per server process, on the shared loop and its pooled Telegram session
+    runtime = get_runtime()
+    return TelegramUploadQueue(sender_factory=lambda: TelegramSender(runtime=runtime), loop=runtime.loop)
+
+def send_telegram_message_and_file(message, file_path):
+    upload_queue = get_telegram_upload_queue()
+    upload_queue.enqueue(file_path, message)
+    print(f"Telegram upload queue: {upload_queue.stats()}")
+
+def main():
     try:
         header_content, image_path, footer_content = initialize()
         
@@ -147,15 +234,24 @@ async def main():
             st.image(image_path, use_column_width=True)
 
         # st.info("אפליקציה זו משתמשת בזיהוי שפות אוטומטי ותומכת במספר שפות, כולל עברית.")
-        st.warning("שימו לב: ניתן להעלות קבצי PDF בעברית בלבד ובגודל של עד 2 מגה-בייט!")
+        st.warning(f"שימו לב: ניתן להעלות קבצי PDF בעברית בלבד ובגודל של עד {MAX_UPLOAD_MB} מגה-בייט!")
 
         uploaded_file = st.file_uploader("יש לבחור קובץ PDF", type="pdf")
 
         if uploaded_file is not None:
-            if uploaded_file.size > 2 * 1024 * 1024:
-                st.error("גודל הקובץ חורג מהמגבלה של 2 מגה-בייט. אנא העלה קובץ קטן יותר.")
-            elif st.button("חלץ קול וטקסט"):
-                await process_file(uploaded_file, uploaded_file.name)
+            if uploaded_file.size > MAX_UPLOAD_MB * 1024 * 1024:
+                st.error(f"גודל הקובץ חורג מהמגבלה של {MAX_UPLOAD_MB} מגה-בייט. אנא העלה קובץ קטן יותר.")
+            else:
+                drop_boilerplate = st.checkbox(
+                    "השמטת כותרות, תחתיות וטקסט שחוזר בכל עמוד",
+                    help=f"בלי אפשרות זו, רק טקסט חוזר של {MIN_SHARED_BLOCK_CHARS} תווים ומעלה מוקרא פעם אחת; כותרות ותחתיות קצרות יותר ומספרי עמודים מוקראים בכל עמוד",
+                )
+                on_demand = st.checkbox("המרה לפי דרישה: רק העמוד שמאזינים לו והעמודים שאחריו")
+                if st.button("חלץ קול וטקסט"):
+                    process_file(uploaded_file, uploaded_file.name, drop_boilerplate=drop_boilerplate, on_demand=on_demand)
+                document = st.session_state.get('on_demand_document')
+                if on_demand and document and document['file_id'] == uploaded_file.file_id:
+                    play_page_by_page(document)
 
     except Exception as e:
         st.error(f"אירעה שגיאה בעת עיבוד הקובץ: {str(e)}")
@@ -165,10 +261,10 @@ async def main():
     st.markdown(footer_with_count, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    if 'telegram_sender' not in st.session_state:
-        st.session_state.telegram_sender = TelegramSender()
+    start_metrics_exporters()
+    get_telegram_upload_queue()
+    initialize_user_count()
     if 'counted' not in st.session_state:
         st.session_state.counted = True
-        increment_user_count()
-    initialize_user_count()
-    asyncio.run(main())
+        increment_user_count(defer=True)
+    main()
@@ -1,36 +1,62 @@
 import os
-from dotenv import load_dotenv
+import time
 import asyncio
+import threading
+from dotenv import load_dotenv
 import aiohttp
 from typing import Optional
 
+from utils.metrics import metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Kept alive and reused across requests instead of a new TCP+TLS handshake per upload
+CONNECTION_LIMIT = 4
+KEEPALIVE_TIMEOUT = 60
+
 class TelegramSender:
-    def __init__(self):
+    def __init__(self, api_base: Optional[str] = None, runtime=None):
+        """
+        runtime, when given, is a utils.runtime.AsyncRuntime whose shared "telegram" session
+        is used instead of one of the sender's own; the runtime closes it, not the sender.
+        """
         self.bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
         self.chat_id = os.getenv("TELEGRAM_CHAT_ID")
         if not self.bot_token or not self.chat_id:
             raise ValueError("TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID must be set in environment variables")
-        self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        api_base = api_base or os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+        self.base_url = f"{api_base}/bot{self.bot_token}"
+        self.runtime = runtime
         self.session = None
+        # Seconds the Bot API asked us to wait after the last 429, if any
+        self.retry_after = None
 
     async def ensure_session(self):
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            if self.runtime is not None:
+                self.session = await self.runtime.session("telegram", limit=CONNECTION_LIMIT, keepalive_timeout=KEEPALIVE_TIMEOUT)
+                return
+            connector = aiohttp.TCPConnector(limit=CONNECTION_LIMIT, keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self.session = aiohttp.ClientSession(connector=connector)
 
     async def close_session(self):
-        if self.session and not self.session.closed:
+        if self.runtime is None and self.session and not self.session.closed:
             await self.session.close()
 
     async def _make_request(self, method: str, endpoint: str, **kwargs):
         await self.ensure_session()
         url = f"{self.base_url}/{endpoint}"
+        self.retry_after = None
         async with getattr(self.session, method)(url, **kwargs) as response:
             if response.status != 200:
                 print(f"Failed to {endpoint}. Status: {response.status}")
                 print(f"Response: {await response.text()}")
+                if response.status == 429:
+                    try:
+                        self.retry_after = (await response.json()).get("parameters", {}).get("retry_after")
+                    except (aiohttp.ContentTypeError, ValueError):
+                        pass
                 return None
             return await response.json()
 
@@ -41,7 +67,7 @@ class TelegramSender:
             return True
         return False
 
-    async def send_message(self, text: str, title: Optional[str] = None) -> None:
+    async def send_message(self, text: str, title: Optional[str] = None) -> bool:
         params = {
             "chat_id": self.chat_id,
             "text": text,
@@ -53,29 +79,154 @@ class TelegramSender:
         result = await self._make_request('post', 'sendMessage', params=params)
         if result:
             print("Message sent successfully")
+        return bool(result)
 
-    async def send_image_and_text(self, image_path: str, caption: Optional[str] = None) -> None:
-        data = aiohttp.FormData()
-        data.add_field("chat_id", self.chat_id)
-        data.add_field("photo", open(image_path, "rb"))
-        if caption:
-            data.add_field("caption", caption)
+    async def send_image_and_text(self, image_path: str, caption: Optional[str] = None) -> bool:
+        # The file is streamed from disk while the request is sent and closed afterwards
+        with open(image_path, "rb") as image_file:
+            data = aiohttp.FormData()
+            data.add_field("chat_id", self.chat_id)
+            data.add_field("photo", image_file, filename=os.path.basename(image_path))
+            if caption:
+                data.add_field("caption", caption)
 
-        result = await self._make_request('post', 'sendPhoto', data=data)
+            result = await self._make_request('post', 'sendPhoto', data=data)
         if result:
             print("Image sent successfully")
+        return bool(result)
 
-    async def send_document(self, document_path: str, caption: Optional[str] = None) -> None:
-        data = aiohttp.FormData()
-        data.add_field("chat_id", self.chat_id)
-        data.add_field("document", open(document_path, "rb"))
-        if caption:
-            data.add_field("caption", caption)
+    async def send_document(self, document_path: str, caption: Optional[str] = None) -> bool:
+        with open(document_path, "rb") as document_file:
+            data = aiohttp.FormData()
+            data.add_field("chat_id", self.chat_id)
+            data.add_field("document", document_file, filename=os.path.basename(document_path))
+            if caption:
+                data.add_field("caption", caption)
 
-        result = await self._make_request('post', 'sendDocument', data=data)
+            result = await self._make_request('post', 'sendDocument', data=data)
         if result:
             print("Document sent successfully")
-            
+        return bool(result)
+
+class TelegramUploadQueue:
+    """
+    Bounded background queue of document uploads.
+
+    The queue's workers run on a long-lived event loop that owns one pooled TelegramSender,
+    so callers return as soon as an upload is enqueued and the session's connections stay
+    warm between uploads. The loop is the given one, such as utils.runtime's (whose shared
+    session the sender can then use), or else a dedicated thread's. Failed uploads are
+    retried with exponential backoff, honouring the Bot API's retry_after on 429.
+    """
+
+    def __init__(self, sender_factory=TelegramSender, max_size=100, workers=2, max_retries=5, initial_delay=2, loop=None):
+        self.sender = sender_factory()
+        self.max_size = max_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.initial_delay = initial_delay
+        self.sent = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.last_latency = None
+        self._queue = None
+        self._worker_tasks = []
+        self._thread = None
+        if loop is not None:
+            self._loop = loop
+            asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        else:
+            self._loop = asyncio.new_event_loop()
+            self._ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="telegram-upload-queue", daemon=True)
+            self._thread.start()
+            self._ready.wait()
+
+    async def _start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def enqueue(self, document_path: str, caption: Optional[str] = None) -> bool:
+        """Schedule an upload without waiting for it. Returns False if the queue is full."""
+        future = asyncio.run_coroutine_threadsafe(self._put(document_path, caption), self._loop)
+        return future.result()
+
+    async def _put(self, document_path, caption):
+        try:
+            self._queue.put_nowait((document_path, caption, time.time()))
+            metrics.set_gauge("telegram_queue_depth", self._queue.qsize())
+            return True
+        except asyncio.QueueFull:
+            print(f"Telegram upload queue is full, dropping {document_path}")
+            metrics.inc("telegram_uploads_total", status="dropped")
+            return False
+
+    async def _worker(self):
+        while True:
+            document_path, caption, enqueued_at = await self._queue.get()
+            try:
+                await self._upload(document_path, caption, enqueued_at)
+            finally:
+                self._queue.task_done()
+                metrics.set_gauge("telegram_queue_depth", self._queue.qsize())
+
+    async def _upload(self, document_path, caption, enqueued_at):
+        delay = self.initial_delay
+        for attempt in range(self.max_retries):
+            try:
+                with metrics.span("telegram_upload"):
+                    sent = await self.sender.send_document(document_path, caption)
+                if sent:
+                    self.last_latency = time.time() - enqueued_at
+                    metrics.observe("telegram_upload_latency_seconds", self.last_latency)
+                    metrics.inc("telegram_uploads_total", status="sent")
+                    self.total_latency += self.last_latency
+                    self.sent += 1
+                    return
+            except FileNotFoundError:
+                print(f"Upload skipped, file no longer exists: {document_path}")
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                print(f"Error uploading {document_path}: {str(e)}")
+            metrics.inc("telegram_upload_retries_total")
+            wait = self.sender.retry_after or delay
+            print(f"Upload of {document_path} failed (attempt {attempt + 1}), retrying in {wait} seconds...")
+            await asyncio.sleep(wait)
+            delay *= 2
+        self.failed += 1
+        metrics.inc("telegram_uploads_total", status="failed")
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "last_latency": self.last_latency,
+            "average_latency": self.total_latency / self.sent if self.sent else None,
+        }
+
+    async def _shutdown(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        await self.sender.close_session()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        if self._thread is not None:
+            # Only a loop this queue started is stopped; a shared one keeps running
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
 # Example usage
 async def main():
     sender = TelegramSender()
@@ -88,4 +239,4 @@ async def main():
         await sender.close_session()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import tempfile
+import unicodedata
+
+from utils.metrics import metrics
+
+class AudioCache:
+    """
+    Content-addressed on-disk cache of synthesized audio, one file per chunk.
+
+    Entries are written to a temporary file and moved into place with os.replace, so
+    readers never see a partial file and several Streamlit sessions or worker processes
+    can share the same directory. Reads bump the file's mtime, which is what the LRU
+    eviction orders by once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=os.path.join("cache", "audio"), max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._approx_size = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_text(text):
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def make_key(cls, text, language, engine, voice_settings=None):
+        payload = json.dumps(
+            [cls.normalize_text(text), language, engine, voice_settings or {}],
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.mp3")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            metrics.inc("audio_cache_misses_total")
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # Evicted by another process between the read and the touch
+        self.hits += 1
+        metrics.inc("audio_cache_hits_total")
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if self._approx_size is None:
+            self._approx_size = self._scan_size()
+        else:
+            self._approx_size += len(data)
+        if self._approx_size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".mp3"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, target_ratio=0.9):
+        """Remove least recently used entries until the cache is below target_ratio of max_bytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * target_ratio
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Already removed by another process
+            total -= size
+            metrics.inc("audio_cache_evictions_total")
+        self._approx_size = total
+        return total
@@ -0,0 +1,142 @@
+import os
+import time
+import asyncio
+import hashlib
+import argparse
+
+from utils.audio_cache import AudioCache
+from utils.dedup import split_repeated_segments
+from utils.language_detection import detect_language
+from utils.pdf_extractor import extract_pages_from_pdf
+from utils.rate_limiter import get_shared_rate_limiter
+from utils.tts_backends import BackendRegistry, FakeBackend, GTTSBackend
+from utils.tts_gtts_converter import gTTSTextToSpeechConverter
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BatchConverter:
+    """
+    Converts a directory of PDFs headlessly with the same extraction and converter code as
+    the app. Up to `jobs` documents run at once; chunks from all of them share the backend's
+    concurrency limit and, for gTTS, the shared adaptive rate limiter.
+
+    Each output <name>.<ext> gets a <name>.sha256 sidecar holding the source PDF's hash and
+    engine, and documents whose output is already up to date are skipped.
+    """
+
+    def __init__(self, out_dir, engine="gtts", jobs=2, language=None, fake_latency=0.05):
+        self.out_dir = out_dir
+        self.engine = engine
+        self.jobs = jobs
+        self.language = language
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.work_dir = os.path.join(self.out_dir, ".work")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.converter = self._build_converter(fake_latency)
+        self.extension = "wav" if engine == "pyttsx3" else "mp3"
+        self.stats = {"converted": 0, "skipped": 0, "failed": 0, "pages": 0, "chars": 0, "audio_bytes": 0}
+
+    def _build_converter(self, fake_latency):
+        if self.engine == "pyttsx3":
+            from utils.tts_pyttsx3_converter import Pyttsx3TextToSpeechConverter
+            return Pyttsx3TextToSpeechConverter(upload_dir=self.work_dir)
+        if self.engine == "fake":
+            backend, rate_limiter = FakeBackend(latency=fake_latency), None
+        else:
+            backend, rate_limiter = GTTSBackend(), get_shared_rate_limiter("gtts")
+        # The registry enforces the backend's concurrency limit across all documents at once
+        return gTTSTextToSpeechConverter(
+            upload_dir=self.work_dir,
+            backend=BackendRegistry([backend]),
+            audio_cache=AudioCache(),
+            rate_limiter=rate_limiter,
+        )
+
+    def _output_paths(self, pdf_path):
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        return os.path.join(self.out_dir, f"{stem}.{self.extension}"), os.path.join(self.out_dir, f"{stem}.sha256")
+
+    def _is_up_to_date(self, output_path, hash_path, signature):
+        if not os.path.exists(output_path):
+            return False
+        try:
+            with open(hash_path) as f:
+                return f.read().strip() == signature
+        except FileNotFoundError:
+            return False
+
+    async def convert_file(self, pdf_path):
+        output_path, hash_path = self._output_paths(pdf_path)
+        signature = f"{await asyncio.to_thread(file_sha256, pdf_path)} {self.engine}"
+        if self._is_up_to_date(output_path, hash_path, signature):
+            print(f"Skipping {pdf_path}: output is up to date")
+            self.stats["skipped"] += 1
+            return
+
+        pages = await extract_pages_from_pdf(pdf_path)
+        text = split_repeated_segments(pages)
+        language = self.language or detect_language("\n".join(pages))
+        if self.engine != "pyttsx3":
+            if language == "he":
+                language = "iw"  # gTTS uses 'iw' for Hebrew
+            if language not in self.converter.available_languages:
+                raise ValueError(f"Language '{language}' is not supported by the {self.engine} engine")
+
+        file_path, conversion_time = await self.converter.text_to_speech(text, language)
+        os.replace(file_path, output_path)
+        with open(hash_path, "w") as f:
+            f.write(signature)
+
+        self.stats["converted"] += 1
+        self.stats["pages"] += len(pages)
+        self.stats["chars"] += len(text)
+        self.stats["audio_bytes"] += os.path.getsize(output_path)
+        print(f"Converted {pdf_path} -> {output_path} in {conversion_time:.2f} seconds")
+
+    async def run(self, pdf_paths):
+        slots = asyncio.Semaphore(self.jobs)
+
+        async def convert_with_slot(pdf_path):
+            async with slots:
+                try:
+                    await self.convert_file(pdf_path)
+                except Exception as e:
+                    print(f"Failed to convert {pdf_path}: {str(e)}")
+                    self.stats["failed"] += 1
+
+        start_time = time.time()
+        await asyncio.gather(*(convert_with_slot(path) for path in pdf_paths))
+        self.stats["seconds"] = time.time() - start_time
+        return self.stats
+
+def find_pdfs(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith(".pdf")
+    )
+
+def print_summary(stats):
+    seconds = max(stats["seconds"], 1e-9)
+    print("\nBatch summary")
+    print(f"   Converted: {stats['converted']}, skipped: {stats['skipped']}, failed: {stats['failed']}")
+    print(f"   Pages: {stats['pages']}, chars: {stats['chars']}, audio: {stats['audio_bytes'] / (1024 * 1024):.1f} MB")
+    print(f"   Time: {stats['seconds']:.2f}s, {stats['pages'] / seconds:.1f} pages/s, {stats['chars'] / seconds:.0f} chars/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a directory of PDF files to audio")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    batch_parser = subparsers.add_parser("batch", help="Convert every PDF in a directory")
+    batch_parser.add_argument("input_dir")
+    batch_parser.add_argument("--out", required=True, help="Directory for the audio files")
+    batch_parser.add_argument("--jobs", type=int, default=2, help="Documents converted at the same time")
+    batch_parser.add_argument("--engine", choices=["gtts", "pyttsx3", "fake"], default="gtts")
+    batch_parser.add_argument("--language", help="Skip detection and use this language code")
+    batch_parser.add_argument("--fake-latency", type=float, default=0.05, help="Seconds per request for --engine fake")
+    args = parser.parse_args()
+
+    batch = BatchConverter(args.out, engine=args.engine, jobs=args.jobs, language=args.language, fake_latency=args.fake_latency)
+    print_summary(asyncio.run(batch.run(find_pdfs(args.input_dir))))
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import tracemalloc
+
+from aiohttp import web
+
+from utils.audio_cache import AudioCache
+from utils.chunker import chunk_text
+from utils.language_detection import detect_language
+from utils.pdf_extractor import iter_pdf_pages
+from utils.tts_backends import FakeBackend
+from utils.tts_gtts_converter import gTTSTextToSpeechConverter
+
+EXAMPLES_DIR = "examples_PDF"
+RESULTS_FILE = "benchmark_results.json"
+STAGES = ["extract", "detect_language", "chunking", "synthesis", "concatenation", "upload"]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class TelegramStub:
+    """Local stand-in for the Bot API's sendDocument, served on a background thread."""
+
+    def __init__(self, port=8765):
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    async def _send_document(self, request):
+        await request.post()
+        return web.json_response({"ok": True, "result": {}})
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/bot{token}/sendDocument", self._send_document)
+        runner = web.AppRunner(app)
+        self._loop.run_until_complete(runner.setup())
+        self._loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", self.port).start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.port}"
+
+async def benchmark_file(path, work_dir, backend, sender, timings):
+    result = {"file": os.path.basename(path)}
+
+    start_time = time.perf_counter()
+    pages = [text async for _, text in iter_pdf_pages(path)]
+    timings["extract"].append(time.perf_counter() - start_time)
+    text = "\n".join(pages)
+    result["pages"] = len(pages)
+    result["chars"] = len(text)
+
+    start_time = time.perf_counter()
+    result["language"] = detect_language(text)
+    timings["detect_language"].append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    chunks = chunk_text(text, backend.capabilities.max_bytes)
+    timings["chunking"].append(time.perf_counter() - start_time)
+    result["chunks"] = len(chunks)
+
+    # Synthesis runs against a cold cache; running it again against the now warm cache leaves
+    # only cache reads and the ordered concatenation into the output file
+    cache = AudioCache(os.path.join(work_dir, "cache"))
+    converter = gTTSTextToSpeechConverter(upload_dir=work_dir, backend=backend, audio_cache=cache)
+    file_path, synthesis_time = await converter.text_to_speech(text, "iw")
+    timings["synthesis"].append(synthesis_time)
+    os.remove(file_path)
+    file_path, concatenation_time = await converter.text_to_speech(text, "iw")
+    timings["concatenation"].append(concatenation_time)
+    result["audio_bytes"] = os.path.getsize(file_path)
+
+    start_time = time.perf_counter()
+    await sender.send_document(file_path, f"benchmark: {result['file']}")
+    timings["upload"].append(time.perf_counter() - start_time)
+    os.remove(file_path)
+
+    result["total_seconds"] = sum(timings[stage][-1] for stage in STAGES)
+    return result
+
+async def run_benchmark(examples_dir, repeat, backend_latency, trace_allocations):
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+    os.environ.setdefault("TELEGRAM_CHAT_ID", "0")
+    from utils.TelegramSender import TelegramSender
+
+    stub = TelegramStub()
+    sender = TelegramSender(api_base=stub.api_base)
+    backend = FakeBackend(latency=backend_latency)
+    timings = {stage: [] for stage in STAGES}
+    files = []
+
+    if trace_allocations:
+        tracemalloc.start()
+    start_rss = peak_rss_mb()
+    start_time = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            for name in sorted(os.listdir(examples_dir)):
+                if not name.lower().endswith(".pdf"):
+                    continue
+                with tempfile.TemporaryDirectory() as work_dir:
+                    files.append(await benchmark_file(os.path.join(examples_dir, name), work_dir, backend, sender, timings))
+                print(f"{files[-1]['file']}: {files[-1]['total_seconds']:.2f}s")
+    finally:
+        await sender.close_session()
+    wall_time = time.perf_counter() - start_time
+
+    results = {
+        "created_at": time.time(),
+        "repeat": repeat,
+        "backend_latency": backend_latency,
+        "stages": {stage: summarize(values) for stage, values in timings.items()},
+        "throughput": {
+            "pages_per_second": sum(f["pages"] for f in files) / wall_time,
+            "chars_per_second": sum(f["chars"] for f in files) / wall_time,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - start_rss,
+        "files": files,
+    }
+    if trace_allocations:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results["allocations"] = {
+            "live_blocks": sum(stat.count for stat in snapshot.statistics("filename")),
+            "peak_traced_mb": peak_traced / (1024 * 1024),
+        }
+    return results
+
+def compare_with_baseline(results, baseline, threshold):
+    """Return the stages whose p50 latency regressed by more than threshold (a fraction)."""
+    regressions = []
+    for stage, summary in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage, {}).get("p50")
+        current = summary["p50"]
+        if previous and current is not None and current > previous * (1 + threshold):
+            regressions.append((stage, previous, current))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end PDF2VOICE pipeline benchmark")
+    parser.add_argument("--examples", default=EXAMPLES_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend-latency", type=float, default=0.05, help="Seconds per fake TTS request")
+    parser.add_argument("--trace-allocations", action="store_true")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--baseline", help="Results file of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50 slowdown before failing")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args.examples, args.repeat, args.backend_latency, args.trace_allocations))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    print(f"\n{'stage':<16}{'p50':>10}{'p90':>10}{'p99':>10}")
+    for stage, summary in results["stages"].items():
+        print(f"{stage:<16}{summary['p50']:>10.4f}{summary['p90']:>10.4f}{summary['p99']:>10.4f}")
+    print(f"Throughput: {results['throughput']['pages_per_second']:.1f} pages/s, "
+          f"{results['throughput']['chars_per_second']:.0f} chars/s")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        for stage, previous, current in regressions:
+            print(f"REGRESSION {stage}: p50 {previous:.4f}s -> {current:.4f}s")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+CHECKPOINT_DIR = os.path.join("uploads", "checkpoints")
+CHECKPOINT_TTL_SECONDS = 24 * 60 * 60
+
+class ConversionCheckpoint:
+    """
+    Completed segments of one document, kept until the conversion finishes.
+
+    Each segment is stored as <index>_<chunk hash>.mp3, so a segment only counts as done
+    if it was synthesized from the same chunk text; the file's existence is the record.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def _chunk_hash(chunk):
+        return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+
+    def _segment_path(self, index, chunk):
+        return os.path.join(self.directory, f"{index}_{self._chunk_hash(chunk)}.mp3")
+
+    def load(self, index, chunk):
+        try:
+            with open(self._segment_path(index, chunk), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, index, chunk, audio):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, self._segment_path(index, chunk))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+class CheckpointStore:
+    def __init__(self, base_dir=CHECKPOINT_DIR, ttl_seconds=CHECKPOINT_TTL_SECONDS):
+        self.base_dir = base_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def open(self, job_key):
+        directory = os.path.join(self.base_dir, hashlib.sha256(job_key.encode("utf-8")).hexdigest())
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(manifest_path):
+            with open(manifest_path, "w") as f:
+                json.dump({"job_key": job_key, "created_at": time.time()}, f)
+        return ConversionCheckpoint(directory)
+
+    def cleanup_expired(self):
+        """Remove checkpoints that have not received a segment within the TTL."""
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(self.base_dir):
+            try:
+                if entry.is_dir() and now - entry.stat().st_mtime > self.ttl_seconds:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
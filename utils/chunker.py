@@ -0,0 +1,163 @@
+import re
+import zlib
+import unicodedata
+
+# Request limits are in UTF-8 bytes, not characters: a Hebrew letter takes two bytes and
+# every nikud mark adds two more. gTTS follows the 5000 bytes per request noted in
+# requirements.txt; pyttsx3 has no hard limit but drives the engine in smaller runs.
+ENGINE_MAX_BYTES = {
+    "gtts": 5000,
+    "pyttsx3": 2000,
+}
+
+# A sentence ends at . ! ? … or the Hebrew sof pasuq (׃), optionally followed by closing
+# quotes (including gershayim) or brackets, and then whitespace. Blank lines also end one.
+SENTENCE_END_RE = re.compile(r'[.!?…׃]+["\'״”’)\]]*(?=\s)|\n\s*\n')
+WHITESPACE_RE = re.compile(r'\s+')
+
+def _is_combining(char):
+    # Covers Hebrew nikud and cantillation marks (U+0591-U+05C7) as well as other scripts
+    return unicodedata.combining(char) != 0
+
+def _iter_sentences(text):
+    # Spans are contiguous: whitespace between sentences (such as the blank line between
+    # paragraphs) belongs to the sentence after it, so its bytes are counted in that chunk
+    start = 0
+    for match in SENTENCE_END_RE.finditer(text):
+        end = match.end()
+        if text[start:end].strip():
+            yield start, end
+            start = end
+    if text[start:].strip():
+        yield start, len(text)
+
+def _split_oversized(text, start, end, max_bytes):
+    """Split one sentence that does not fit in max_bytes at word boundaries, or inside a word as a last resort."""
+    piece_start = start
+    piece_bytes = 0
+    position = start
+    for match in WHITESPACE_RE.finditer(text, start, end):
+        word_end = match.end()
+        word_bytes = len(text[position:word_end].encode("utf-8"))
+        if piece_bytes + word_bytes > max_bytes and piece_bytes > 0:
+            yield piece_start, position
+            piece_start, piece_bytes = position, 0
+        if word_bytes > max_bytes:
+            yield from _split_word(text, position, word_end, max_bytes)
+            piece_start, piece_bytes = word_end, 0
+        else:
+            piece_bytes += word_bytes
+        position = word_end
+    tail_bytes = len(text[position:end].encode("utf-8"))
+    if piece_bytes + tail_bytes > max_bytes and piece_bytes > 0:
+        yield piece_start, position
+        piece_start = position
+    if tail_bytes > max_bytes:
+        yield from _split_word(text, piece_start, end, max_bytes)
+    elif text[piece_start:end].strip():
+        yield piece_start, end
+
+def _split_word(text, start, end, max_bytes):
+    """Cut a single run of text by bytes without separating a letter from its nikud."""
+    piece_start = start
+    piece_bytes = 0
+    position = start
+    while position < end:
+        # Treat a base character and its combining marks as one unit
+        unit_end = position + 1
+        while unit_end < end and _is_combining(text[unit_end]):
+            unit_end += 1
+        unit_bytes = len(text[position:unit_end].encode("utf-8"))
+        if piece_bytes + unit_bytes > max_bytes and piece_bytes > 0:
+            yield piece_start, position
+            piece_start, piece_bytes = position, 0
+        piece_bytes += unit_bytes
+        position = unit_end
+    if piece_start < end:
+        yield piece_start, end
+
+def _is_boundary(sentence, sentence_bytes, max_bytes):
+    """
+    Content-defined cut point: decided by the sentence itself rather than by its position,
+    so an edit only moves the boundaries of the chunk it falls in. The chance of cutting
+    grows with the sentence's size, so chunks average about half the byte budget.
+    """
+    return zlib.crc32(sentence.encode("utf-8")) % max_bytes < 2 * sentence_bytes
+
+def chunk_text(text, max_bytes):
+    """
+    Pack whole sentences into chunks of at most max_bytes UTF-8 bytes.
+
+    Runs in a single linear pass. Sentences longer than the budget are split at word
+    boundaries, and words longer than the budget at character boundaries that keep nikud
+    attached to its letter.
+    """
+    chunks = []
+    chunk_start = None
+    chunk_end = None
+    chunk_bytes = 0
+    min_bytes = max_bytes // 4
+
+    def flush():
+        if chunk_start is not None:
+            chunk = text[chunk_start:chunk_end].strip()
+            if chunk:
+                chunks.append(chunk)
+
+    for sentence_start, sentence_end in _iter_sentences(text):
+        sentence_bytes = len(text[sentence_start:sentence_end].encode("utf-8"))
+        if sentence_bytes > max_bytes:
+            pieces = list(_split_oversized(text, sentence_start, sentence_end, max_bytes))
+        else:
+            pieces = [(sentence_start, sentence_end)]
+
+        for piece_start, piece_end in pieces:
+            piece_bytes = sentence_bytes if len(pieces) == 1 else len(text[piece_start:piece_end].encode("utf-8"))
+            if chunk_start is not None and chunk_bytes + piece_bytes > max_bytes:
+                flush()
+                chunk_start, chunk_bytes = None, 0
+            if chunk_start is None:
+                chunk_start = piece_start
+            chunk_end = piece_end
+            chunk_bytes += piece_bytes
+
+            if chunk_bytes >= min_bytes and _is_boundary(text[piece_start:piece_end].strip(), piece_bytes, max_bytes):
+                flush()
+                chunk_start, chunk_bytes = None, 0
+
+    flush()
+    return chunks
+
+def chunk_text_for_engine(text, engine):
+    return chunk_text(text, ENGINE_MAX_BYTES[engine])
+
+# Largest chunk against the budget, on the bundled examples and on mixed Hebrew/English text
+if __name__ == "__main__":
+    import os
+    import sys
+    import random
+
+    import PyPDF2
+
+    from utils.normalize import normalize_text
+
+    examples_dir = sys.argv[1] if len(sys.argv) > 1 else "examples_PDF"
+    texts = {}
+    for name in sorted(os.listdir(examples_dir)):
+        if name.lower().endswith(".pdf"):
+            reader = PyPDF2.PdfReader(os.path.join(examples_dir, name))
+            texts[name] = "\n\n".join(normalize_text(page.extract_text() or "") for page in reader.pages)
+    random.seed(0)
+    words = ["שלום", "עולם", "הַמִּשְׁפָּט", "project", "manager", "delivery.", "סוף.", "end!"]
+    paragraphs = (" ".join(random.choice(words) for _ in range(random.randint(5, 80))) for _ in range(5000))
+    texts["mixed (200k words)"] = "\n\n".join(paragraphs)
+
+    failed = False
+    for engine, max_bytes in ENGINE_MAX_BYTES.items():
+        for name, text in texts.items():
+            chunks = chunk_text(text, max_bytes)
+            largest = max((len(chunk.encode("utf-8")) for chunk in chunks), default=0)
+            failed |= largest > max_bytes
+            print(f"{engine:<8}{name[:48]:<50}{len(chunks):>6} chunks, largest {largest:>5} / {max_bytes} bytes"
+                  f"{'  OVER BUDGET' if largest > max_bytes else ''}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,150 @@
+import os
+import time
+import uuid
+import asyncio
+import argparse
+import threading
+
+from utils.audio_cache import AudioCache
+from utils.checkpoint import CheckpointStore
+from utils.job_queue import HEARTBEAT_SECONDS, JobQueue
+from utils.metrics import metrics, start_exporters_from_env
+from utils.rate_limiter import get_shared_rate_limiter
+from utils.tts_gtts_converter import gTTSTextToSpeechConverter
+
+AUDIO_OUTPUT_DIR = os.path.join("static", "audio")
+CHECKPOINT_CLEANUP_INTERVAL = 10 * 60
+
+def segment_path(output_dir, job_id, index):
+    return os.path.join(output_dir, f"{job_id}_{index}.mp3")
+
+class ConversionService:
+    """
+    Pool of background workers that take conversion jobs from a JobQueue.
+
+    Workers run in threads, each with its own event loop, so a conversion keeps going after
+    the Streamlit rerun or browser tab that submitted it is gone. They share one warm
+    converter, and with it one connection pool and executor for the TTS service. Several processes can run
+    workers against the same queue; `python -m utils.conversion_service` starts a standalone one.
+    """
+
+    def __init__(self, queue=None, output_dir=AUDIO_OUTPUT_DIR, audio_cache=None, poll_interval=0.5, converter_factory=None, rate_limiter=None, checkpoints=None):
+        self.queue = queue or JobQueue()
+        # Every worker, in this and any other process, draws from the same gTTS budget
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter("gtts")
+        self.checkpoints = checkpoints or CheckpointStore()
+        self.converter_factory = converter_factory or (
+            lambda: gTTSTextToSpeechConverter(upload_dir=self.output_dir, audio_cache=self.audio_cache, rate_limiter=self.rate_limiter)
+        )
+        self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.audio_cache = audio_cache
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+        self.converter = None
+
+    def start(self, workers=2):
+        if self.converter is None:
+            self.converter = self.converter_factory()
+        for _ in range(workers):
+            thread = threading.Thread(target=self._run_worker, name="conversion-worker", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run_worker(self):
+        asyncio.run(self._worker_loop(f"{os.getpid()}-{uuid.uuid4().hex[:8]}"))
+
+    async def _worker_loop(self, worker_id):
+        converter = self.converter
+        last_cleanup = 0
+        while not self._stop.is_set():
+            if time.time() - last_cleanup > CHECKPOINT_CLEANUP_INTERVAL:
+                self.checkpoints.cleanup_expired()
+                last_cleanup = time.time()
+            # Only take on new work while the shared budget has room for it
+            if await self.rate_limiter.fetch_available_tokens() < 1:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            metrics.set_gauge("conversion_queue_depth", self.queue.depth())
+            job = self.queue.claim(worker_id)
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self.run_job(converter, job)
+
+    async def _heartbeat(self, job_id, worker_id, conversion):
+        """
+        Keep the job claimed while chunks wait on the rate limiter, which can take longer than
+        STALE_JOB_SECONDS. Stops the conversion and returns True if the job was taken over.
+        """
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            if not self.queue.heartbeat(job_id, worker_id):
+                conversion.cancel()
+                return True
+
+    async def run_job(self, converter, job):
+        job_id = job['id']
+        worker_id = job['worker_id']
+        print(f"Worker starting job {job_id}")
+
+        async def update_status(status, progress):
+            self.queue.update_progress(job_id, worker_id, progress, message=status)
+
+        async def save_segment(index, total, audio_bytes):
+            with open(segment_path(self.output_dir, job_id, index), 'wb') as segment_file:
+                segment_file.write(audio_bytes)
+            # Progress is left to update_status: chunks finish out of order, so a value derived
+            # from the segment index would move the bar backwards between the two
+            self.queue.update_progress(job_id, worker_id, segments=index + 1, total_segments=total)
+
+        # Keyed by document and language, so a retried or requeued job picks up its segments
+        checkpoint = self.checkpoints.open(job['dedup_key'])
+        conversion = asyncio.ensure_future(converter.text_to_speech(
+            job['text'], job['language'], status_callback=update_status, segment_callback=save_segment,
+            checkpoint=checkpoint, per_chunk_language=True, page_offsets=job['page_offsets'],
+        ))
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id, worker_id, conversion))
+        try:
+            file_path, conversion_time = await conversion
+        except asyncio.CancelledError:
+            if not (heartbeat.done() and heartbeat.result()):
+                raise
+            print(f"Job {job_id} was taken over by another worker, stopping")
+            return
+        except Exception as e:
+            print(f"Job {job_id} failed: {str(e)}")
+            metrics.inc("conversion_jobs_total", status="failed")
+            self.queue.fail(job_id, worker_id, e)
+            return
+        finally:
+            heartbeat.cancel()
+        if not self.queue.complete(job_id, worker_id, file_path, conversion_time):
+            print(f"Job {job_id} was taken over by another worker, discarding {file_path}")
+            return
+        metrics.inc("conversion_jobs_total", status="done")
+        metrics.observe("conversion_job_seconds", conversion_time)
+        print(f"Job {job_id} done in {conversion_time:.2f} seconds")
+
+# Run a standalone worker process against the shared queue
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run PDF2VOICE conversion workers")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    start_exporters_from_env()
+    service = ConversionService(audio_cache=AudioCache()).start(workers=args.workers)
+    print(f"Started {args.workers} conversion workers")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        service.stop()
@@ -1,43 +1,111 @@
 import os
 import json
+import time
+import atexit
+import sqlite3
+import threading
 import streamlit as st
 
-# File to store user count
+# File to store user count. The JSON file is the original store; its count is migrated
+# into the SQLite database the first time the database is initialized.
 DATA_FOLDER = 'data'
 USER_COUNT_FILE = os.path.join(DATA_FOLDER, 'user_count.json')
+USER_COUNT_DB_FILE = os.path.join(DATA_FOLDER, 'user_count.sqlite3')
+COUNTER_NAME = 'users'
 
-def initialize_user_count():
-    os.makedirs(DATA_FOLDER, exist_ok=True)
-    if not os.path.exists(USER_COUNT_FILE):
-        with open(USER_COUNT_FILE, 'w') as f:
-            json.dump({"count": 0}, f)
+# Footer reads within this window are served from memory instead of the database
+READ_CACHE_TTL_SECONDS = 5
+# Deferred increments are written at most this long after the first of them arrives
+BATCH_INTERVAL_SECONDS = 2
 
-def get_user_count(formatted=False):
+_cache = {"count": None, "read_at": 0.0}
+_pending = {"amount": 0, "since": None, "timer": None}
+_lock = threading.Lock()
+
+def _connect():
+    conn = sqlite3.connect(USER_COUNT_DB_FILE, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def _read_json_count():
     try:
         with open(USER_COUNT_FILE, 'r') as f:
-            data = json.load(f)
-        count = data.get("count", 0)
-        if formatted:            
-            return format_count(count)
-        return count
+            return json.load(f).get("count", 0)
     except (json.JSONDecodeError, FileNotFoundError):
         return 0
 
-def increment_user_count():
-    count = get_user_count()
-    count += 1    
-    with open(USER_COUNT_FILE, 'w') as f:
-        json.dump({"count": count}, f)
+def initialize_user_count():
+    os.makedirs(DATA_FOLDER, exist_ok=True)
+    with _connect() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # INSERT OR IGNORE makes the migration safe when several processes start at once
+        conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, ?)", (COUNTER_NAME, _read_json_count()))
+
+def get_user_count(formatted=False):
+    now = time.time()
+    with _lock:
+        count = _cache["count"]
+        if count is None or now - _cache["read_at"] > READ_CACHE_TTL_SECONDS:
+            try:
+                with _connect() as conn:
+                    row = conn.execute("SELECT value FROM counters WHERE name = ?", (COUNTER_NAME,)).fetchone()
+                count = row[0] if row else 0
+            except sqlite3.OperationalError:
+                count = 0
+            _cache["count"], _cache["read_at"] = count, now
+        count += _pending["amount"]
+    if formatted:
+        return format_count(count)
+    return count
+
+def _add(amount):
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE counters SET value = MAX(0, value + ?) WHERE name = ?", (amount, COUNTER_NAME))
+        row = conn.execute("SELECT value FROM counters WHERE name = ?", (COUNTER_NAME,)).fetchone()
+        conn.execute("COMMIT")
+    count = row[0] if row else 0
+    _cache["count"], _cache["read_at"] = count, time.time()
     return count
 
+def increment_user_count(amount=1, defer=False):
+    """
+    Atomically add to the count. With defer=True the increment is buffered in memory and
+    written together with any others that arrive within BATCH_INTERVAL_SECONDS, by a timer
+    started with the first of them (or at exit, if that comes first).
+    """
+    with _lock:
+        if not defer:
+            return _add(amount + _take_pending())
+        _pending["amount"] += amount
+        if _pending["since"] is None:
+            _pending["since"] = time.time()
+            timer = _pending["timer"] = threading.Timer(BATCH_INTERVAL_SECONDS, flush_user_count)
+            timer.daemon = True
+            timer.start()
+        return (_cache["count"] or 0) + _pending["amount"]
+
+def _take_pending():
+    amount = _pending["amount"]
+    if _pending["timer"] is not None:
+        _pending["timer"].cancel()
+    _pending["amount"], _pending["since"], _pending["timer"] = 0, None, None
+    return amount
+
+def flush_user_count():
+    with _lock:
+        amount = _take_pending()
+        if amount:
+            _add(amount)
+
+atexit.register(flush_user_count)
+
 def decrement_user_count():
     print("Decrementing user count")
     
-    count = get_user_count()
-    count = max(0, count - 1)  # Ensure count doesn't go below 0
-    with open(USER_COUNT_FILE, 'w') as f:
-        json.dump({"count": count}, f)
-    return count
+    # The count never goes below 0
+    with _lock:
+        return _add(-1)
 
 def format_count(count):
     """Format the count with commas and round to nearest thousand if over 1000"""    
@@ -56,4 +124,34 @@ USER_COUNT_CSS = """
 
 }
 </style>
-"""
\ No newline at end of file
+"""
+
+def _use_database(path):
+    global USER_COUNT_DB_FILE
+    USER_COUNT_DB_FILE = path
+
+def _stress_worker(increments):
+    for _ in range(increments):
+        increment_user_count()
+
+# Stress test: many processes incrementing at once must not lose a single increment.
+# It runs against a throwaway database, never the live count.
+if __name__ == "__main__":
+    import tempfile
+    from multiprocessing import Pool
+
+    processes, increments = 16, 200
+    db_path = os.path.join(tempfile.mkdtemp(), 'user_count.sqlite3')
+    _use_database(db_path)
+    initialize_user_count()
+    before = get_user_count()
+    start_time = time.time()
+    with Pool(processes, initializer=_use_database, initargs=(db_path,)) as pool:
+        pool.map(_stress_worker, [increments] * processes)
+    elapsed = time.time() - start_time
+
+    _cache["count"] = None
+    after = get_user_count()
+    expected = processes * increments
+    print(f"{processes} processes x {increments} increments in {elapsed:.2f}s ({expected / elapsed:.0f}/s)")
+    print(f"Count went from {before} to {after}: {'OK' if after - before == expected else 'LOST INCREMENTS'}")
@@ -0,0 +1,125 @@
+import re
+from collections import Counter
+
+from utils.chunker import chunk_text
+
+# Joins segments in the text handed to the converter; each segment is chunked on its own,
+# so a repeated header always becomes the same chunk and is synthesized only once.
+SEGMENT_SEPARATOR = "\f"
+# Marks where a page starts while segments are assembled; removed before returning
+PAGE_MARK = "\x00"
+
+WHITESPACE_RE = re.compile(r'\s+')
+DIGITS_RE = re.compile(r'\d+')
+
+# Shorter lines ("a", "1") repeat by chance, especially in letter-spaced PDF text
+MIN_REPEATED_LINE_CHARS = 8
+# A repeated block only gets its own shared segment when it is long enough to be worth the
+# extra chunk boundary around it; shorter furniture stays inline (or is dropped)
+MIN_SHARED_BLOCK_CHARS = 200
+
+def _exact_line_key(line):
+    return WHITESPACE_RE.sub(' ', line).strip()
+
+def _line_key(line):
+    # Page numbers and dates change from page to page, so "Page 3 of 40" matches "Page 4 of 40"
+    return DIGITS_RE.sub('#', _exact_line_key(line))
+
+def find_repeated_lines(pages, min_pages=3, min_ratio=0.3, key=_line_key):
+    """Return the keys of lines that appear on at least min_pages pages and min_ratio of all pages."""
+    page_counts = Counter()
+    for page in pages:
+        page_counts.update({line_key for line_key in map(key, page.splitlines()) if len(line_key) >= MIN_REPEATED_LINE_CHARS})
+    threshold = max(min_pages, min_ratio * len(pages))
+    return {key for key, count in page_counts.items() if count >= threshold}
+
+def split_repeated_segments(pages, drop_boilerplate=False, min_pages=3, min_ratio=0.3, with_page_offsets=False):
+    """
+    Split per-page text into segments in reading order. Runs of lines repeated word for word
+    (running headers, footers, disclaimers) that are long enough become segments of their
+    own, so they chunk identically everywhere and are synthesized once. Lines that only
+    repeat with their numbers masked ("Page 3 of 40") differ on every page and stay inline.
+    With drop_boilerplate every repeated line, numbered ones included, is left out. Returns
+    the segments joined by SEGMENT_SEPARATOR.
+
+    with_page_offsets also returns, for every page, the offset in that text where its first
+    spoken line starts, as (text, offsets).
+    """
+    # A shared block is only synthesized once if its text is the same on every page
+    key = _line_key if drop_boilerplate else _exact_line_key
+    repeated = find_repeated_lines(pages, min_pages, min_ratio, key)
+    segments = []
+    body = []
+    block = []
+    # Pages whose start has not been placed yet; they start at the next line that is kept
+    pending_pages = 0
+
+    def mark(line):
+        nonlocal pending_pages
+        if not with_page_offsets or not pending_pages or not line.strip():
+            return line
+        line, pending_pages = PAGE_MARK * pending_pages + line, 0
+        return line
+
+    def end_block():
+        if not block:
+            return
+        block_text = "\n".join(block)
+        if drop_boilerplate:
+            pass
+        elif len(block_text) >= MIN_SHARED_BLOCK_CHARS:
+            if body:
+                segments.append("\n".join(body))
+                body.clear()
+            segments.append(block_text)
+        else:
+            body.extend(block)
+        block.clear()
+
+    for page in pages:
+        pending_pages += 1
+        for line in page.splitlines():
+            if key(line) in repeated:
+                block.append(line.strip() if drop_boilerplate else mark(line.strip()))
+            else:
+                end_block()
+                body.append(mark(line))
+        end_block()
+    if body:
+        segments.append("\n".join(body))
+    text = SEGMENT_SEPARATOR.join(segment for segment in segments if segment.strip())
+    if not with_page_offsets:
+        return text
+    offsets = [match.start() - i for i, match in enumerate(re.finditer(PAGE_MARK, text))]
+    offsets.extend([len(text) - len(offsets)] * pending_pages)
+    return text.replace(PAGE_MARK, ""), offsets
+
+def split_pages(text, page_offsets):
+    """Cut the text returned with page offsets by split_repeated_segments into one text per page."""
+    ends = list(page_offsets[1:]) + [len(text)]
+    return [text[start:end].strip() for start, end in zip(page_offsets, ends)]
+
+def split_segments(text):
+    return [segment for segment in text.split(SEGMENT_SEPARATOR) if segment.strip()]
+
+def chunk_segments(text, max_bytes):
+    return [chunk for segment in split_segments(text) for chunk in chunk_text(segment, max_bytes)]
+
+def dedup_report(pages, segmented_text, max_bytes):
+    """
+    Characters and TTS requests saved by segmenting (and optionally dropping) repeated text.
+    The savings are negative when the extra chunk boundaries cost more than sharing saves.
+    """
+    original_chunks = chunk_text("\n".join(pages), max_bytes)
+    original_chars = sum(len(chunk) for chunk in original_chunks)
+    original_requests = len(original_chunks)
+    unique_chunks = set(chunk_segments(segmented_text, max_bytes))
+    synthesized_chars = sum(len(chunk) for chunk in unique_chunks)
+    return {
+        "original_chars": original_chars,
+        "synthesized_chars": synthesized_chars,
+        "chars_saved": original_chars - synthesized_chars,
+        "original_requests": original_requests,
+        "requests": len(unique_chunks),
+        "requests_saved": original_requests - len(unique_chunks),
+    }
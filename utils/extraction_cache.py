@@ -0,0 +1,78 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+
+from utils.metrics import metrics
+
+EXTRACTION_CACHE_FILE = os.path.join("cache", "extraction.sqlite3")
+
+# Bump when extraction or normalization changes, so older entries are extracted again
+EXTRACTION_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    pdf_hash TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    language TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    pages BLOB NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_accessed ON documents (accessed_at);
+"""
+
+class ExtractionCache:
+    """
+    Per-page text and detected language of every PDF seen, keyed by the file's SHA-256.
+
+    A repeated upload skips both parsing and language detection. Pages are stored as one
+    zlib-compressed JSON list per document in a SQLite file shared by every session and
+    worker process; the least recently used documents are dropped past max_bytes.
+    """
+
+    def __init__(self, db_path=EXTRACTION_CACHE_FILE, max_bytes=256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def get(self, pdf_hash):
+        """Return (pages, language) for the document, or None if it has not been extracted."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT language, pages FROM documents WHERE pdf_hash = ? AND version = ?",
+                (pdf_hash, EXTRACTION_VERSION),
+            ).fetchone()
+            if row is None:
+                metrics.inc("extraction_cache_misses_total")
+                return None
+            conn.execute("UPDATE documents SET accessed_at = ? WHERE pdf_hash = ?", (time.time(), pdf_hash))
+        metrics.inc("extraction_cache_hits_total")
+        language, pages = row
+        return json.loads(zlib.decompress(pages)), language
+
+    def put(self, pdf_hash, pages, language):
+        blob = zlib.compress(json.dumps(pages, ensure_ascii=False).encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (pdf_hash, version, language, page_count, pages, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (pdf_hash, EXTRACTION_VERSION, language, len(pages), blob, time.time()),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(LENGTH(pages)), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for pdf_hash, size in conn.execute("SELECT pdf_hash, LENGTH(pages) FROM documents ORDER BY accessed_at").fetchall():
+            conn.execute("DELETE FROM documents WHERE pdf_hash = ?", (pdf_hash,))
+            total -= size
+            if total <= self.max_bytes:
+                break
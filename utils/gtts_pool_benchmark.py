@@ -0,0 +1,130 @@
+import os
+import ssl
+import json
+import time
+import base64
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from utils.benchmark import summarize
+from utils.tts_backends import SILENT_MP3_FRAME, GTTSBackend
+
+GTTS_PATH = "/_/TranslateWebserverUi/data/batchexecute"
+
+class GTTSStub:
+    """
+    Local stand-in for the Google Translate TTS endpoint gTTS talks to, served on a
+    background thread, optionally over TLS. It answers in the same batchexecute format with
+    silent MP3 frames and counts the client connections it accepts.
+    """
+
+    def __init__(self, port=8766, latency=0.0, tls=False):
+        self.port = port
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self.cert_file = None
+        self._ssl_context = self._make_ssl_context() if tls else None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def _make_ssl_context(self):
+        # Self-signed certificate for 127.0.0.1; clients trust it through verify=cert_file
+        cert_dir = tempfile.mkdtemp()
+        self.cert_file = os.path.join(cert_dir, "cert.pem")
+        key_file = os.path.join(cert_dir, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+             "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key_file, "-out", self.cert_file],
+            check=True, capture_output=True,
+        )
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(self.cert_file, key_file)
+        return context
+
+    async def _batchexecute(self, request):
+        form = await request.post()
+        rpc = json.loads(form["f.req"])
+        text = json.loads(rpc[0][0][1])[0]
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        audio = base64.b64encode(SILENT_MP3_FRAME * max(1, len(text) // 4)).decode("ascii")
+        body = ")]}'\n\n" + json.dumps([["wrb.fr", "jQ1olc", json.dumps([audio]), None, None, None, "generic"]], separators=(",", ":"))
+        return web.Response(text=body)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_post(GTTS_PATH, self._batchexecute)
+        app.on_response_prepare.append(lambda request, response: self._note_transport(request))
+        runner = web.AppRunner(app)
+        self._loop.run_until_complete(runner.setup())
+        self._loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", self.port, ssl_context=self._ssl_context).start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _note_transport(self, request):
+        # A connection is new when its transport has not served a request before
+        transport = request.transport
+        if not getattr(transport, "_gtts_stub_seen", False):
+            transport._gtts_stub_seen = True
+            self.connections += 1
+
+    @property
+    def api_base(self):
+        scheme = "https" if self._ssl_context else "http"
+        return f"{scheme}://127.0.0.1:{self.port}"
+
+class PerRequestSessionBackend(GTTSBackend):
+    """What gTTS does on its own: a new session, and so a new connection, per request."""
+
+    def _send(self, prepared):
+        import requests
+
+        prepared.url = self.api_base + prepared.path_url
+        with requests.Session() as session:
+            return session.send(prepared, timeout=30, verify=self.session.verify)
+
+def measure(backend, chunks, workers):
+    latencies = []
+
+    def timed(chunk):
+        start_time = time.perf_counter()
+        backend.synthesize(chunk, "iw")
+        latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(timed, chunks))
+    return summarize(latencies), time.perf_counter() - start_time
+
+# Per-chunk latency with and without the shared connection pool, against the local stand-in
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="gTTS connection pool benchmark against a local stand-in")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the stand-in waits per request")
+    parser.add_argument("--no-tls", action="store_true", help="Serve plain HTTP instead of HTTPS")
+    args = parser.parse_args()
+
+    stub = GTTSStub(latency=args.latency, tls=not args.no_tls)
+    verify = stub.cert_file or True
+    chunks = [f"זהו משפט מספר {i} שנשלח לשירות ההקראה לצורך מדידה." for i in range(args.requests)]
+
+    print(f"{'client':<14}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'total s':>10}{'connections':>13}")
+    for label, backend_class in (("per-request", PerRequestSessionBackend), ("pooled", GTTSBackend)):
+        backend = backend_class(concurrency=args.workers, api_base=stub.api_base, verify=verify)
+        connections_before = stub.connections
+        summary, total = measure(backend, chunks, args.workers)
+        backend.close()
+        print(f"{label:<14}{summary['p50'] * 1000:>10.2f}{summary['p90'] * 1000:>10.2f}{summary['p99'] * 1000:>10.2f}"
+              f"{total:>10.2f}{stub.connections - connections_before:>13}")
@@ -1,14 +1,31 @@
 import streamlit as st
 from streamlit.components.v1 import html
 import os
+import threading
+
+# path -> (mtime, contents); reruns reuse the contents until the file changes on disk
+_asset_cache = {}
+_asset_lock = threading.Lock()
+
+def read_asset(path):
+    """Return the file's text, read from disk only when its mtime has changed. Raises FileNotFoundError."""
+    mtime = os.stat(path).st_mtime_ns
+    with _asset_lock:
+        cached = _asset_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        contents = f.read()
+    with _asset_lock:
+        _asset_cache[path] = (mtime, contents)
+    return contents
 
 def initialize():
     st.set_page_config(layout="wide", page_title="אפליקציה ההופכת קובץ PDF בעברית לקול ומחלצת גם את הטקסט", page_icon="🎙️")
     
     # Load external CSS
     css_file_path = os.path.join('utils', 'styles.css')
-    with open(css_file_path, 'r') as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    st.markdown(f'<style>{read_asset(css_file_path)}</style>', unsafe_allow_html=True)
 
     # # Load external JavaScript
     # js_file_path = os.path.join('utils', 'script.js')
@@ -18,8 +35,7 @@ def initialize():
     # Load header content
     header_file_path = os.path.join('utils', 'header.md')
     try:
-        with open(header_file_path, 'r', encoding='utf-8') as header_file:
-            header_content = header_file.read()
+        header_content = read_asset(header_file_path)
     except FileNotFoundError:
         st.error("header.md file not found in utils folder.")
         header_content = ""  # Provide a default empty header
@@ -36,8 +52,7 @@ def initialize():
     # Load footer content
     footer_file_path = os.path.join('utils', 'footer.md')
     try:
-        with open(footer_file_path, 'r', encoding='utf-8') as footer_file:
-            footer_content = footer_file.read()
+        footer_content = read_asset(footer_file_path)
     except FileNotFoundError:
         st.error("footer.md file not found in utils folder.")
         footer_content = ""  # Provide a default empty footer    
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+
+DATA_FOLDER = 'data'
+JOBS_DB_FILE = os.path.join(DATA_FOLDER, 'jobs.sqlite3')
+
+# A running job whose worker has not reported for this long is assumed lost and requeued
+STALE_JOB_SECONDS = 120
+# Workers report on their running job this often, even while waiting on the rate limiter
+HEARTBEAT_SECONDS = STALE_JOB_SECONDS / 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    dedup_key TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    language TEXT NOT NULL,
+    text TEXT NOT NULL,
+    page_offsets TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    segments INTEGER NOT NULL DEFAULT 0,
+    total_segments INTEGER,
+    result_path TEXT,
+    conversion_time REAL,
+    error TEXT,
+    worker_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = {
+    "page_offsets": "ALTER TABLE jobs ADD COLUMN page_offsets TEXT",
+    "priority": "ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0",
+}
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+class JobQueue:
+    """
+    SQLite-backed conversion queue shared by every Streamlit session and worker process.
+
+    Jobs are deduplicated on (PDF hash, language): submitting a document that is already
+    queued, running or done returns the existing job id instead of creating a new one.
+    Queued jobs are taken highest priority first, then oldest first. Updates to a running
+    job only apply while the worker that claimed it still owns it, so a worker that went
+    silent and had its job requeued cannot overwrite the new owner's result.
+    """
+
+    def __init__(self, db_path=JOBS_DB_FILE):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, statement in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(statement)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, pdf_hash, language, text, page_offsets=None, priority=0):
+        """
+        page_offsets, when given, is where each PDF page starts in text; it becomes chapter
+        markers. Resubmitting a queued job raises its priority to priority if that is higher.
+        """
+        dedup_key = f"{pdf_hash}:{language}"
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT * FROM jobs WHERE dedup_key = ?", (dedup_key,)).fetchone()
+                if row is not None and self._is_reusable(row):
+                    if priority > row['priority']:
+                        conn.execute("UPDATE jobs SET priority = ? WHERE id = ?", (priority, row['id']))
+                    conn.execute("COMMIT")
+                    return row['id']
+
+                job_id = str(uuid.uuid4())
+                if row is not None:
+                    conn.execute("DELETE FROM jobs WHERE id = ?", (row['id'],))
+                conn.execute(
+                    "INSERT INTO jobs (id, dedup_key, status, language, text, page_offsets, priority, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, dedup_key, QUEUED, language, text, json.dumps(page_offsets) if page_offsets is not None else None, priority, now, now),
+                )
+                conn.execute("COMMIT")
+                return job_id
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _is_reusable(row):
+        if row['status'] == FAILED:
+            return False
+        if row['status'] == DONE:
+            # The audio may have been cleaned up since the job finished
+            return bool(row['result_path']) and os.path.exists(row['result_path'])
+        return True
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, language, progress, message, segments, total_segments, result_path, conversion_time, error FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def claim(self, worker_id):
+        """Atomically take the oldest queued job, or a running job whose worker went silent."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND updated_at < ?) ORDER BY priority DESC, created_at LIMIT 1",
+                    (QUEUED, RUNNING, now - STALE_JOB_SECONDS),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker_id = ?, progress = 0, segments = 0, updated_at = ? WHERE id = ?",
+                    (RUNNING, worker_id, now, row['id']),
+                )
+                conn.execute("COMMIT")
+                job = dict(row, worker_id=worker_id)
+                job['page_offsets'] = json.loads(job['page_offsets']) if job['page_offsets'] else None
+                return job
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    # Each of these returns False when worker_id no longer owns the running job
+
+    def heartbeat(self, job_id, worker_id):
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (time.time(), job_id, worker_id, RUNNING),
+            ).rowcount > 0
+
+    def update_progress(self, job_id, worker_id, progress=None, message=None, segments=None, total_segments=None):
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message), segments = COALESCE(?, segments), "
+                "total_segments = COALESCE(?, total_segments), updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (progress, message, segments, total_segments, time.time(), job_id, worker_id, RUNNING),
+            ).rowcount > 0
+
+    def complete(self, job_id, worker_id, result_path, conversion_time):
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, progress = 1, result_path = ?, conversion_time = ?, text = '', updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (DONE, result_path, conversion_time, time.time(), job_id, worker_id, RUNNING),
+            ).rowcount > 0
+
+    def fail(self, job_id, worker_id, error):
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (FAILED, str(error), time.time(), job_id, worker_id, RUNNING),
+            ).rowcount > 0
+
+    def depth(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
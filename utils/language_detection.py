@@ -0,0 +1,114 @@
+import re
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+from utils.metrics import metrics
+
+DEFAULT_LANGUAGE = 'en'
+
+HEBREW_RE = re.compile(r'[א-ת]')
+LATIN_RE = re.compile(r'[A-Za-zÀ-ɏ]')
+
+# The script pre-check settles a sample when one script has at least this share of its letters
+SCRIPT_DECISION_RATIO = 0.8
+SAMPLE_COUNT = 8
+SAMPLE_CHARS = 500
+# Stop sampling once this many snippets agree with at least CONFIDENT_PROBABILITY
+CONFIDENT_AGREEMENT = 3
+CONFIDENT_PROBABILITY = 0.9
+
+CACHE_SIZE = 256
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _script_language(text):
+    """Return 'he' when Hebrew letters dominate, 'latin' when Latin letters do, else None."""
+    hebrew = len(HEBREW_RE.findall(text))
+    latin = len(LATIN_RE.findall(text))
+    letters = hebrew + latin
+    if letters == 0:
+        return None
+    if hebrew / letters >= SCRIPT_DECISION_RATIO:
+        return 'he'
+    if latin / letters >= SCRIPT_DECISION_RATIO:
+        return 'latin'
+    return None
+
+def _samples(text, count=SAMPLE_COUNT, size=SAMPLE_CHARS):
+    """Snippets taken evenly across the document, cut at whitespace, so cost does not grow with its length."""
+    if len(text) <= count * size:
+        yield text
+        return
+    stride = len(text) // count
+    for i in range(count):
+        start = text.find(' ', i * stride)
+        start = i * stride if start == -1 else start + 1
+        end = text.rfind(' ', start, start + size)
+        yield text[start:end if end > start else start + size]
+
+def _langdetect(text):
+    # Imported on first use: loading the language profiles is slow and most documents
+    # are settled by the script check without it
+    from langdetect import DetectorFactory, detect_langs
+    from langdetect.lang_detect_exception import LangDetectException
+
+    # langdetect is randomized unless seeded; seed it so the same text always gets the same answer
+    DetectorFactory.seed = 0
+    try:
+        best = detect_langs(text)[0]
+        return best.lang, best.prob
+    except LangDetectException:
+        return None, 0.0
+
+def _detect_uncached(text):
+    votes = Counter()
+    confident = Counter()
+    for sample in _samples(text):
+        # Samples written in Hebrew script are settled without langdetect
+        if _script_language(sample) == 'he':
+            language, probability = 'he', 1.0
+        else:
+            language, probability = _langdetect(sample)
+        if language is None:
+            continue
+        votes[language] += probability
+        if probability >= CONFIDENT_PROBABILITY:
+            confident[language] += 1
+            if confident[language] >= CONFIDENT_AGREEMENT:
+                return language
+    if not votes:
+        return DEFAULT_LANGUAGE
+    return votes.most_common(1)[0][0]
+
+def detect_language(text, cache_key=None):
+    """
+    Detect the document's language from a bounded number of stratified samples.
+
+    A script check settles Hebrew samples without running langdetect; the others are
+    classified by it. Sampling stops once enough samples agree. Results are cached by cache_key (for example the
+    PDF hash), or by a hash of the text.
+    """
+    with metrics.span("language_detection"):
+        key = cache_key or hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+        language = _detect_uncached(text)
+        with _cache_lock:
+            _cache[key] = language
+            if len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        return language
+
+def detect_chunk_language(chunk, fallback):
+    """Label one chunk for per-segment routing; returns fallback when the chunk is ambiguous."""
+    script = _script_language(chunk)
+    if script == 'he':
+        return 'he'
+    if script == 'latin':
+        language, probability = _langdetect(chunk[:SAMPLE_CHARS * 2])
+        if language is not None and probability >= CONFIDENT_PROBABILITY:
+            return language
+    return fallback
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import bisect
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the histogram buckets used for every timer
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and latency histograms.
+
+    Recording is a dict update under a lock, cheap enough to leave on under load. The
+    registry can be exported in Prometheus text format or as JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0}
+            index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+            if index < len(LATENCY_BUCKETS):
+                histogram["buckets"][index] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block into the histogram <name>_seconds."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start_time, **labels)
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+    def render_prometheus(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: {**h, "buckets": list(h["buckets"])} for key, h in self._histograms.items()}
+        lines = []
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append(f"# TYPE {name} {kind}")
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        def entries(values):
+            return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in values.items()]
+
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "pid": os.getpid(),
+                "counters": entries(self._counters),
+                "gauges": entries(self._gauges),
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "count": h["count"], "sum": h["sum"]}
+                    for (name, labels), h in self._histograms.items()
+                ],
+            }
+
+metrics = MetricsRegistry()
+
+def start_http_exporter(port, registry=metrics):
+    """Serve the registry in Prometheus text format at http://0.0.0.0:<port>/metrics."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
+
+def start_json_flusher(path, interval=15, registry=metrics):
+    """Write the registry to path every interval seconds, replacing the file atomically."""
+    def flush_forever():
+        while True:
+            time.sleep(interval)
+            directory = os.path.dirname(path) or "."
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(registry.to_dict(), f)
+            os.replace(temp_path, path)
+
+    thread = threading.Thread(target=flush_forever, name="metrics-json-flusher", daemon=True)
+    thread.start()
+    return thread
+
+def start_exporters_from_env():
+    """Start the exporters configured by METRICS_PORT and METRICS_JSON_FILE, if any."""
+    started = []
+    if os.getenv("METRICS_PORT"):
+        started.append(start_http_exporter(int(os.getenv("METRICS_PORT"))))
+    if os.getenv("METRICS_JSON_FILE"):
+        started.append(start_json_flusher(os.getenv("METRICS_JSON_FILE"), int(os.getenv("METRICS_FLUSH_INTERVAL", "15"))))
+    return started
@@ -0,0 +1,244 @@
+import struct
+from array import array
+from bisect import bisect_right
+
+# Layer III only; that is what gTTS and the fake backend produce
+BITRATES_KBPS = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+VERSION_BITS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+
+XING_FLAGS = 0x1 | 0x2 | 0x4  # frame count, byte count and seek table
+XING_TOC_ENTRIES = 100
+
+# Room kept at the start of the file for the ID3 tag and the Xing frame, which are only
+# known once every segment is written: a fixed part plus an allowance per chapter
+HEADER_RESERVE_BYTES = 2048
+HEADER_RESERVE_PER_CHAPTER = 96
+
+class FrameHeader:
+    __slots__ = ("version", "bitrate_index", "sample_rate_index", "padding", "channel_mode", "header")
+
+    @classmethod
+    def parse(cls, data, offset):
+        """Return the Layer III frame header at offset, or None if there is not one there."""
+        if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+            return None
+        b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+        version = VERSION_BITS.get((b1 >> 3) & 0b11)
+        bitrate_index = b2 >> 4
+        sample_rate_index = (b2 >> 2) & 0b11
+        if version is None or (b1 >> 1) & 0b11 != 0b01 or bitrate_index in (0, 15) or sample_rate_index == 3:
+            return None
+        header = cls()
+        header.version = version
+        header.bitrate_index = bitrate_index
+        header.sample_rate_index = sample_rate_index
+        header.padding = (b2 >> 1) & 1
+        header.channel_mode = b3 >> 6
+        header.header = bytes(data[offset:offset + 4])
+        return header
+
+    @property
+    def sample_rate(self):
+        return SAMPLE_RATES[self.version][self.sample_rate_index]
+
+    @property
+    def samples(self):
+        return 1152 if self.version == 1 else 576
+
+    @property
+    def side_info_size(self):
+        mono = self.channel_mode == 0b11
+        if self.version == 1:
+            return 17 if mono else 32
+        return 9 if mono else 17
+
+    def frame_length(self, bitrate_index=None, padding=None):
+        bitrate = BITRATES_KBPS[1 if self.version == 1 else 2][self.bitrate_index if bitrate_index is None else bitrate_index] * 1000
+        coefficient = 144 if self.version == 1 else 72
+        return coefficient * bitrate // self.sample_rate + (self.padding if padding is None else padding)
+
+def _skip_id3v2(data, offset):
+    if data[offset:offset + 3] == b"ID3" and len(data) >= offset + 10:
+        size = _syncsafe_decode(data[offset + 6:offset + 10])
+        footer = 10 if data[offset + 5] & 0x10 else 0
+        return offset + 10 + size + footer
+    return offset
+
+def _is_info_frame(data, offset, header):
+    tag_offset = offset + 4 + header.side_info_size
+    return data[tag_offset:tag_offset + 4] in (b"Xing", b"Info")
+
+def iter_frames(data):
+    """
+    Yield (offset, length, header) for each audio frame in one encoded segment, skipping
+    ID3 tags, Xing/Info frames and anything between frames that is not a frame header.
+    """
+    offset = _skip_id3v2(data, 0)
+    end = len(data)
+    while offset + 4 <= end:
+        header = FrameHeader.parse(data, offset)
+        if header is None:
+            if data[offset:offset + 3] == b"TAG":
+                return  # ID3v1 tag at the end
+            offset += 1
+            continue
+        length = header.frame_length()
+        if offset + length > end:
+            return
+        if not _is_info_frame(data, offset, header):
+            yield offset, length, header
+        offset += length
+
+def _syncsafe_encode(value):
+    return bytes([(value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F])
+
+def _syncsafe_decode(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+def _id3_frame(frame_id, body):
+    # ID3v2.3 frame sizes are plain big-endian integers
+    return frame_id.encode("ascii") + struct.pack(">IH", len(body), 0) + body
+
+def _text_frame(frame_id, text):
+    # Encoding 1 is UTF-16 with a BOM, the only Unicode encoding ID3v2.3 has
+    return _id3_frame(frame_id, b"\x01" + text.encode("utf-16"))
+
+def build_id3_tag(chapters, size):
+    """
+    ID3v2.3 tag of exactly size bytes holding a CHAP frame per chapter and a table of
+    contents, padded with zeros. chapters is a list of (element_id, title, start_ms, end_ms,
+    start_byte, end_byte). Returns None if they do not fit.
+    """
+    frames = []
+    if chapters and len(chapters) <= 255:
+        children = b"".join(element_id.encode("ascii") + b"\x00" for element_id, *_ in chapters)
+        # Flags: top-level and ordered
+        frames.append(_id3_frame("CTOC", b"toc\x00" + bytes([0x03, len(chapters)]) + children))
+    for element_id, title, start_ms, end_ms, start_byte, end_byte in chapters:
+        body = element_id.encode("ascii") + b"\x00" + struct.pack(">IIII", start_ms, end_ms, start_byte, end_byte)
+        frames.append(_id3_frame("CHAP", body + _text_frame("TIT2", title)))
+    body = b"".join(frames)
+    if 10 + len(body) > size:
+        return None
+    return b"ID3\x03\x00\x00" + _syncsafe_encode(size - 10) + body + bytes(size - 10 - len(body))
+
+class SeekableMP3Writer:
+    """
+    Writes MP3 segments into one file and makes the result seekable.
+
+    Segments are appended as they arrive, with any tags or Xing frames of their own
+    stripped, while an index of every frame's byte offset and start time is kept. finish()
+    then fills the space reserved at the start of the file with an ID3 tag carrying chapter
+    markers (CHAP, with both time and byte offsets) and a Xing frame with the frame count,
+    byte count and seek table, so players know the duration and can jump to any point
+    without scanning from the start.
+    """
+
+    def __init__(self, path, chapter_count=0):
+        self.path = path
+        self.file = open(path, "wb")
+        self.header_size = HEADER_RESERVE_BYTES + HEADER_RESERVE_PER_CHAPTER * chapter_count
+        self.file.write(bytes(self.header_size))
+        # Audio byte offset and start time (in samples) of every frame
+        self.frame_offsets = array("Q")
+        self.frame_samples = array("Q")
+        self.audio_bytes = 0
+        self.total_samples = 0
+        self.first_header = None
+        self.indexed = True
+
+    @property
+    def duration(self):
+        return self.total_samples / self.first_header.sample_rate if self.first_header else 0.0
+
+    def write_segment(self, data):
+        """Append one encoded segment. Returns its (start_seconds, duration_seconds)."""
+        start = self.duration
+        frames = list(iter_frames(data))
+        if not frames:
+            # Not something we can index; keep the audio but leave the file without a seek table
+            self.indexed = False
+            self.file.write(data)
+            self.audio_bytes += len(data)
+            return start, 0.0
+        if self.first_header is None:
+            self.first_header = frames[0][2]
+        view = memoryview(data)
+        for offset, length, header in frames:
+            self.frame_offsets.append(self.audio_bytes)
+            self.frame_samples.append(self.total_samples)
+            self.file.write(view[offset:offset + length])
+            self.audio_bytes += length
+            self.total_samples += header.samples
+        return start, self.duration - start
+
+    def byte_offset_at(self, seconds):
+        """File offset of the frame playing at seconds."""
+        if not self.frame_offsets:
+            return self.header_size
+        samples = int(seconds * self.first_header.sample_rate)
+        index = max(0, bisect_right(self.frame_samples, samples) - 1)
+        return self.header_size + self.frame_offsets[index]
+
+    def _xing_frame(self):
+        header = self.first_header
+        payload_size = 4 + header.side_info_size + 16 + XING_TOC_ENTRIES
+        # Use the lowest bitrate whose frame can hold the Xing data, as encoders do
+        bitrate_index = next(
+            index for index in range(1, 15) if header.frame_length(bitrate_index=index, padding=0) >= payload_size
+        )
+        frame_length = header.frame_length(bitrate_index=bitrate_index, padding=0)
+        total_bytes = frame_length + self.audio_bytes
+        toc = bytearray()
+        for i in range(XING_TOC_ENTRIES):
+            position = frame_length + self.byte_offset_at(self.duration * i / XING_TOC_ENTRIES) - self.header_size
+            toc.append(min(255, position * 256 // total_bytes))
+        # Same version, layer, sample rate and channel mode as the audio; no CRC, no padding
+        frame_header = bytes([
+            0xFF,
+            header.header[1] | 0x01,
+            (bitrate_index << 4) | (header.sample_rate_index << 2),
+            header.header[3],
+        ])
+        frame = bytearray(frame_length)
+        frame[0:4] = frame_header
+        tag_offset = 4 + header.side_info_size
+        frame[tag_offset:tag_offset + 16] = b"Xing" + struct.pack(">III", XING_FLAGS, len(self.frame_offsets), total_bytes)
+        frame[tag_offset + 16:tag_offset + 16 + XING_TOC_ENTRIES] = toc
+        return bytes(frame)
+
+    def finish(self, chapters=()):
+        """
+        Write the ID3 tag and Xing frame and close the file. chapters is a list of
+        (title, start_seconds) in order; each chapter runs until the next one starts.
+        """
+        xing = self._xing_frame() if self.indexed and self.first_header else b""
+        end_ms = int(self.duration * 1000)
+        end_byte = self.header_size + self.audio_bytes
+        chapter_frames = []
+        if self.indexed:
+            for i, (title, start_seconds) in enumerate(chapters):
+                next_start = chapters[i + 1][1] if i + 1 < len(chapters) else None
+                chapter_frames.append((
+                    f"ch{i + 1}", title,
+                    int(start_seconds * 1000), int(next_start * 1000) if next_start is not None else end_ms,
+                    self.byte_offset_at(start_seconds), self.byte_offset_at(next_start) if next_start is not None else end_byte,
+                ))
+        tag = build_id3_tag(chapter_frames, self.header_size - len(xing))
+        if tag is None:
+            print(f"Chapter markers do not fit in the reserved header of {self.path}, writing without them")
+            tag = build_id3_tag([], self.header_size - len(xing))
+        self.file.seek(0)
+        self.file.write(tag + xing)
+        self.file.close()
+
+    def close(self):
+        self.file.close()
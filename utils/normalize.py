@@ -0,0 +1,106 @@
+import os
+import re
+import sys
+import time
+import unicodedata
+
+# One visible character, with any Hebrew points or cantillation marks attached to it
+_CHAR = r'[^\s][֑-ׇ]*'
+
+# Every rule is one alternative of a single pattern, so the text is rewritten in one scan
+NORMALIZE_RE = re.compile(
+    # "T e c h n i c a l": three or more single characters separated by single spaces
+    rf'(?P<spaced>(?<!\S)(?:{_CHAR} ){{2,}}{_CHAR}(?!\S))'
+    # "conver-\nsion": a word hyphenated across a line break
+    r'|(?P<hyphen>(?<=[A-Za-z])-[ \t]*\n[ \t]*(?=[a-z]))'
+    # "quality ." : stray spaces PDF extraction puts before punctuation. A space before a
+    # hyphen is left alone, since "with -v" and "-ללא" are ordinary text
+    r'|(?P<detached>[ \t\xa0]+(?=[.,;:!?](?:\s|$)))'
+    # Line breaks with the spaces around them; blank lines collapse to one
+    r'|(?P<newlines>[ \t\xa0]+\n[ \t\xa0\n]*|\n[ \t\xa0\n]+)'
+    r'|(?P<spaces>[ \t\xa0]{2,}|[\t\xa0])'
+)
+TOKEN_RE = re.compile(r'\S+')
+SINGLE_CHAR_TOKEN_RE = re.compile(rf'(?<!\S){_CHAR}(?!\S)')
+
+# A line is letter-spaced when at least this share of its tokens are single characters;
+# below it, runs like "a b c" in ordinary text are left alone
+LETTER_SPACED_RATIO = 0.6
+
+def _is_letter_spaced(line):
+    tokens = sum(1 for _ in TOKEN_RE.finditer(line))
+    singles = sum(1 for _ in SINGLE_CHAR_TOKEN_RE.finditer(line))
+    return tokens > 0 and singles / tokens >= LETTER_SPACED_RATIO
+
+def _is_spaced_word(run):
+    # Runs with math operators are formulas ("x = a + b"), even on a letter-spaced line
+    return not any(unicodedata.category(character) == 'Sm' for character in run)
+
+def normalize_text(text):
+    """
+    Clean up text extracted from a PDF for speech.
+
+    Letter-spaced runs are joined back into words, but only on lines where most tokens are
+    single characters, so ordinary words are never glued together. Words hyphenated across
+    a line break are rejoined, stray spaces before punctuation are dropped, and runs of
+    whitespace and blank lines are collapsed. Line structure is otherwise kept, since
+    repeated header and footer lines are detected line by line.
+    """
+    # Matches arrive in order, so the current line is found by scanning only the text since
+    # the previous letter-spaced match; searching back from each match is quadratic on long lines
+    line = {'scanned': 0, 'start': 0, 'spaced': None}
+
+    def replace(match):
+        kind = match.lastgroup
+        if kind == 'spaced':
+            newline = text.rfind('\n', line['scanned'], match.start())
+            if newline != -1:
+                line['start'], line['spaced'] = newline + 1, None
+            line['scanned'] = match.start()
+            if line['spaced'] is None:
+                line_end = text.find('\n', match.end())
+                line['spaced'] = _is_letter_spaced(text[line['start']:line_end if line_end != -1 else len(text)])
+            run = match.group()
+            return run.replace(' ', '') if line['spaced'] and _is_spaced_word(run) else run
+        if kind == 'hyphen' or kind == 'detached':
+            return ''
+        if kind == 'newlines':
+            return '\n\n' if match.group().count('\n') > 1 else '\n'
+        return ' '
+
+    return NORMALIZE_RE.sub(replace, text).strip()
+
+# Before/after size, chunk count and throughput on the bundled examples and a large input
+if __name__ == "__main__":
+    import PyPDF2
+
+    from utils.chunker import ENGINE_MAX_BYTES, chunk_text
+
+    examples_dir = sys.argv[1] if len(sys.argv) > 1 else "examples_PDF"
+    raw_texts = {}
+    for name in sorted(os.listdir(examples_dir)):
+        if name.lower().endswith(".pdf"):
+            path = os.path.join(examples_dir, name)
+            # Raw page text, before the normalization extraction now applies
+            reader = PyPDF2.PdfReader(path)
+            raw_texts[name] = "\n".join(page.extract_text() or "" for page in reader.pages)
+
+    max_bytes = ENGINE_MAX_BYTES["gtts"]
+    print(f"{'file':<50}{'chars':>10}{'->':>4}{'chars':>10}{'chunks':>8}{'->':>4}{'chunks':>8}{'ms':>8}")
+    for name, raw in raw_texts.items():
+        start_time = time.perf_counter()
+        normalized = normalize_text(raw)
+        elapsed = time.perf_counter() - start_time
+        print(f"{name[:48]:<50}{len(raw):>10}{'':>4}{len(normalized):>10}"
+              f"{len(chunk_text(raw, max_bytes)):>8}{'':>4}{len(chunk_text(normalized, max_bytes)):>8}{elapsed * 1000:>8.1f}")
+
+    corpus = "\n".join(raw_texts.values())
+    large = corpus * max(1, (8 * 1024 * 1024) // max(1, len(corpus.encode("utf-8"))))
+    size_mb = len(large.encode("utf-8")) / (1024 * 1024)
+    print()
+    # The same input as one line too: PDFs without line breaks must not cost more per byte
+    for label, sample in (("lines", large), ("one line", large.replace("\n", " "))):
+        start_time = time.perf_counter()
+        normalize_text(sample)
+        elapsed = time.perf_counter() - start_time
+        print(f"{size_mb:.1f} MB input ({label}) normalized in {elapsed:.2f}s ({size_mb / elapsed:.1f} MB/s)")
@@ -0,0 +1,45 @@
+import os
+import time
+
+from utils.job_queue import JobQueue
+
+READ_AHEAD_PAGES = int(os.getenv("READ_AHEAD_PAGES", "2"))
+
+class PagePrefetcher:
+    """
+    Synthesizes a document one page at a time, as it is listened to.
+
+    Every page is its own job in the shared JobQueue, keyed by document and page, so pages
+    are converted once no matter how many sessions play them and survive reruns. Requesting
+    a page queues it ahead of everything else, followed by the read_ahead pages after it;
+    pages nobody reaches are never sent to the TTS service.
+    """
+
+    def __init__(self, queue, pdf_hash, language, page_texts, read_ahead=READ_AHEAD_PAGES):
+        self.queue = queue or JobQueue()
+        self.pdf_hash = pdf_hash
+        self.language = language
+        self.page_texts = page_texts
+        self.read_ahead = min(read_ahead, 999)
+
+    @property
+    def page_count(self):
+        return len(self.page_texts)
+
+    def _submit(self, index, priority):
+        if not self.page_texts[index]:
+            return None
+        return self.queue.submit(f"{self.pdf_hash}:page-{index + 1}", self.language, self.page_texts[index], priority=priority)
+
+    def request(self, index):
+        """
+        Queue page index (from 0) for synthesis now and the pages after it behind it.
+        Returns the page's job id, or None if the page has no text.
+        """
+        # The page asked for most recently goes first, then its read-ahead in page order;
+        # steps of 1000 per millisecond keep read-ahead below any later request
+        priority = int(time.time() * 1000) * 1000
+        job_id = self._submit(index, priority)
+        for distance, ahead in enumerate(range(index + 1, min(index + 1 + self.read_ahead, self.page_count)), start=1):
+            self._submit(ahead, priority - distance)
+        return job_id
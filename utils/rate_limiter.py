@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+
+DATA_FOLDER = 'data'
+RATE_LIMIT_DB_FILE = os.path.join(DATA_FOLDER, 'rate_limits.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    rate REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    acquired INTEGER NOT NULL DEFAULT 0,
+    throttled INTEGER NOT NULL DEFAULT 0,
+    waited_seconds REAL NOT NULL DEFAULT 0
+);
+"""
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to the backend (additive increase, multiplicative
+    decrease): every 429 halves the rate and empties the bucket, every success adds a
+    little back.
+
+    The bucket lives in a SQLite row, so every converter in every process that uses the
+    same name and database file draws from one budget.
+    """
+
+    def __init__(self, name, db_path=RATE_LIMIT_DB_FILE, initial_rate=2.0, min_rate=0.1, max_rate=10.0,
+                 burst=4, increase_step=0.05, decrease_factor=0.5):
+        self.name = name
+        self.db_path = db_path
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO buckets (name, tokens, rate, updated_at) VALUES (?, ?, ?, ?)",
+                (name, float(burst), initial_rate, time.time()),
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _transaction(self, update):
+        """Refill the bucket, apply update(tokens, rate) -> (tokens, rate, result) and store it atomically."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, rate, updated_at = conn.execute(
+                    "SELECT tokens, rate, updated_at FROM buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                now = time.time()
+                tokens = min(self.burst, tokens + max(0.0, now - updated_at) * rate)
+                tokens, rate, result = update(tokens, rate)
+                conn.execute(
+                    "UPDATE buckets SET tokens = ?, rate = ?, updated_at = ? WHERE name = ?",
+                    (tokens, rate, now, self.name),
+                )
+                conn.execute("COMMIT")
+                return result
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return how many seconds until one is."""
+        def take(tokens, rate):
+            if tokens >= 1:
+                return tokens - 1, rate, 0.0
+            return tokens, rate, (1 - tokens) / rate
+        return self._transaction(take)
+
+    # Every call writes the SQLite row and can wait up to the lock timeout for another
+    # process, so coroutines run them in the loop's executor rather than on the loop
+
+    @staticmethod
+    async def _off_loop(function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def acquire(self):
+        waited = 0.0
+        while True:
+            wait = await self._off_loop(self.try_acquire)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        await self._off_loop(lambda: self._add_counters(acquired=1, waited_seconds=waited))
+        return waited
+
+    async def report_success(self):
+        await self._off_loop(self.on_success)
+
+    async def report_throttled(self):
+        await self._off_loop(self.on_throttled)
+
+    async def fetch_available_tokens(self):
+        return await self._off_loop(self.available_tokens)
+
+    def on_success(self):
+        self._transaction(lambda tokens, rate: (tokens, min(self.max_rate, rate + self.increase_step), None))
+
+    def on_throttled(self):
+        self._transaction(lambda tokens, rate: (0.0, max(self.min_rate, rate * self.decrease_factor), None))
+        self._add_counters(throttled=1)
+
+    def available_tokens(self):
+        return self._transaction(lambda tokens, rate: (tokens, rate, tokens))
+
+    def _add_counters(self, acquired=0, throttled=0, waited_seconds=0.0):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE buckets SET acquired = acquired + ?, throttled = throttled + ?, waited_seconds = waited_seconds + ? WHERE name = ?",
+                (acquired, throttled, waited_seconds, self.name),
+            )
+
+    def stats(self):
+        with self._connect() as conn:
+            rate, acquired, throttled, waited_seconds = conn.execute(
+                "SELECT rate, acquired, throttled, waited_seconds FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+        return {"rate": rate, "acquired": acquired, "throttled": throttled, "waited_seconds": waited_seconds}
+
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+def get_shared_rate_limiter(name):
+    """Limiter instance shared by every converter in this process; the budget itself is shared across processes."""
+    with _shared_limiters_lock:
+        if name not in _shared_limiters:
+            _shared_limiters[name] = AdaptiveRateLimiter(name)
+        return _shared_limiters[name]
@@ -0,0 +1,88 @@
+import os
+import atexit
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+RUNTIME_THREAD_WORKERS = int(os.getenv("RUNTIME_THREAD_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+
+class AsyncRuntime:
+    """
+    Process-wide event loop running on a background thread.
+
+    Streamlit reruns the script on a new thread for every interaction, so anything created
+    with asyncio.run there dies with the rerun. Long-lived async state (client sessions,
+    upload queues, in-flight work) lives on this loop instead, and the script thread hands
+    coroutines to it with run() and waits for the result.
+
+    The loop's default executor is a shared thread pool, so run_in_executor(None, ...) in
+    any coroutine on it reuses the same threads. Client sessions handed out by session()
+    are closed with the runtime.
+    """
+
+    def __init__(self, thread_workers=RUNTIME_THREAD_WORKERS):
+        self.thread_executor = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="runtime")
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.thread_executor)
+        self._sessions = {}
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="async-runtime", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule coro on the runtime loop and return a concurrent.futures.Future for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run coro on the runtime loop and block the calling thread until it finishes."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def session(self, name="default", **connector_kwargs):
+        """
+        Shared aiohttp session, created on first use and kept open for the life of the
+        process so its connections are reused. Must be awaited on the runtime loop.
+        """
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**connector_kwargs))
+            self._sessions[name] = session
+        return session
+
+    async def _close_sessions(self):
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
+
+    def close(self):
+        if not self.loop.is_running():
+            return
+        self.run(self._close_sessions())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.thread_executor.shutdown(wait=False, cancel_futures=True)
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime():
+    """The process's AsyncRuntime, started on first use and closed at exit."""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = AsyncRuntime()
+            atexit.register(_runtime.close)
+    return _runtime
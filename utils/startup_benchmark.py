@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from utils.benchmark import compare_with_baseline, summarize
+
+RESULTS_FILE = "startup_benchmark_results.json"
+STAGES = ["interpreter", "cold_import", "first_run", "rerun"]
+
+def time_subprocess(code):
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+    return time.perf_counter() - start_time
+
+def slowest_imports(module, limit=10):
+    """Modules with the highest cumulative import time when module is imported cold."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], check=True, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:limit]
+
+def time_app_runs(script, reruns):
+    """First run and reruns of the Streamlit script in one process, as a server session sees them."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.abspath(script), default_timeout=60)
+    start_time = time.perf_counter()
+    app.run()
+    first_run = time.perf_counter() - start_time
+    rerun_times = []
+    for _ in range(reruns):
+        start_time = time.perf_counter()
+        app.run()
+        rerun_times.append(time.perf_counter() - start_time)
+    if app.exception:
+        raise RuntimeError(f"{script} raised: {app.exception[0].message}")
+    return first_run, rerun_times
+
+def run_benchmark(module, script, repeat, reruns):
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        timings["interpreter"].append(time_subprocess("pass"))
+        timings["cold_import"].append(time_subprocess(f"import {module}"))
+
+    first_run, rerun_times = time_app_runs(script, reruns)
+    timings["first_run"].append(first_run)
+    timings["rerun"].extend(rerun_times)
+
+    return {
+        "module": module,
+        "repeat": repeat,
+        "stages": {stage: summarize(values) for stage, values in timings.items()},
+        "slowest_imports": [{"module": name, "seconds": seconds} for seconds, name in slowest_imports(module)],
+    }
+
+# Cold-start and per-rerun cost of the Streamlit app
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF2VOICE startup benchmark")
+    parser.add_argument("--module", default="main", help="Module whose cold import is timed")
+    parser.add_argument("--script", default="main.py", help="Streamlit script whose runs are timed")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--baseline", help="Results file of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50 slowdown before failing")
+    args = parser.parse_args()
+
+    # The app builds its Telegram upload queue on startup; nothing is sent without an upload
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "startup-benchmark")
+    os.environ.setdefault("TELEGRAM_CHAT_ID", "0")
+
+    results = run_benchmark(args.module, args.script, args.repeat, args.reruns)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n{'stage':<16}{'p50':>10}{'p90':>10}{'max':>10}")
+    for stage, summary in results["stages"].items():
+        print(f"{stage:<16}{summary['p50']:>10.4f}{summary['p90']:>10.4f}{summary['max']:>10.4f}")
+    print("\nSlowest imports (cumulative):")
+    for entry in results["slowest_imports"]:
+        print(f"  {entry['seconds']:>8.4f}s  {entry['module']}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        for stage, previous, current in regressions:
+            print(f"REGRESSION {stage}: p50 {previous:.4f}s -> {current:.4f}s")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
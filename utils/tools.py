@@ -1,11 +1,27 @@
 import os
-from io import BytesIO
+import sys
+import hashlib
+import tempfile
 import requests
 from dotenv import load_dotenv
 
+from utils.normalize import normalize_text
+
 # Load environment variables
 load_dotenv()
 
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+def _copy_in_chunks(uploaded_file, f, digest=None):
+    uploaded_file.seek(0)
+    while True:
+        chunk = uploaded_file.read(SPOOL_CHUNK_BYTES)
+        if not chunk:
+            break
+        f.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+
 def save_uploaded_file(uploaded_file, upload_dir="uploads", filename=None):
     """
     Save the uploaded file to the specified directory and return the file path.
@@ -18,15 +34,28 @@ def save_uploaded_file(uploaded_file, upload_dir="uploads", filename=None):
 
     file_path = os.path.join(upload_dir, filename)
     
-    if isinstance(uploaded_file, BytesIO):
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
-    else:
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+    # Copied a chunk at a time rather than through another full copy in memory
+    with open(file_path, "wb") as f:
+        _copy_in_chunks(uploaded_file, f)
     
     return file_path
 
+def spool_upload(uploaded_file, upload_dir="uploads"):
+    """
+    Write the upload to a temporary file in upload_dir a chunk at a time, hashing it on the
+    way. Returns (path, sha256 hex digest); the caller removes the file when done with it.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(dir=upload_dir, suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            _copy_in_chunks(uploaded_file, f, digest)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
 def get_image_url(query):
     UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
 
@@ -37,19 +66,21 @@ def get_image_url(query):
         return data['results'][0]['urls']['regular']
     return None
 
-import nltk
-nltk.download('brown')
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('movie_reviews')
-
+NLTK_CORPORA = ['brown', 'punkt', 'averaged_perceptron_tagger', 'movie_reviews']
 
-# import textblob
-# textblob.download_corpora()
+def download_corpora():
+    """
+    Fetch the NLTK corpora TextBlob needs. Run once per environment with
+    `python -m utils.tools setup` rather than on every import.
+    """
+    import nltk
 
-from textblob import TextBlob
+    for corpus in NLTK_CORPORA:
+        nltk.download(corpus)
 
 def translate_text(text, target_language):
+    from textblob import TextBlob
+
     blob = TextBlob(text)
     # source_language = blob.detect_language()
 
@@ -60,22 +91,11 @@ def translate_text(text, target_language):
     return translated_blob
     # return str(blob.translate(to=target_language))
 
-def clean_text(input_text):
-    # Split the text into lines
-    lines = input_text.split('\n')
-    
-    # Process each line
-    cleaned_lines = []
-    for line in lines:
-        # Remove spaces between characters and strip leading/trailing spaces
-        cleaned_line = ''.join(line.split()).strip()
-        if cleaned_line:  # Only add non-empty lines
-            cleaned_lines.append(cleaned_line)
-    
-    # Join the cleaned lines back together
-    return ' '.join(cleaned_lines)
-
 if __name__ == "__main__":
+    if sys.argv[1:] == ["setup"]:
+        download_corpora()
+        sys.exit(0)
+
     print("main")
 
     # Your input text goes here
@@ -133,7 +153,7 @@ if __name__ == "__main__":
     """  # The rest of your text goes here
 
     # Clean the text
-    cleaned_text = clean_text(input_text)
+    cleaned_text = normalize_text(input_text)
 
     # Print the cleaned text
     print(cleaned_text)
@@ -0,0 +1,249 @@
+import io
+import os
+import re
+import time
+import zlib
+import base64
+import threading
+from dataclasses import dataclass
+from typing import FrozenSet, Protocol
+
+from utils.chunker import ENGINE_MAX_BYTES
+
+class BackendThrottledError(Exception):
+    """Raised by a backend when the service asks us to slow down (HTTP 429 or equivalent)."""
+
+class UnsupportedLanguageError(ValueError):
+    """Raised when no backend can synthesize the requested language; retrying will not help."""
+
+@dataclass(frozen=True)
+class BackendCapabilities:
+    languages: FrozenSet[str]
+    max_bytes: int
+    concurrency: int
+    output_format: str
+
+class TTSBackend(Protocol):
+    """
+    Synthesizes one chunk at a time. synthesize() is blocking and is run in an executor by
+    the converter; it returns the encoded audio or raises BackendThrottledError.
+    """
+    name: str
+    capabilities: BackendCapabilities
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        ...
+
+# Connections kept open to the gTTS endpoint; also the number of requests in flight
+GTTS_POOL_SIZE = int(os.getenv("GTTS_POOL_SIZE", "4"))
+GTTS_REQUEST_TIMEOUT = 30
+# The pool relies on gTTS internals: gTTS._prepare_requests() and this copy of the pattern
+# gTTS.stream() uses to find the audio in a response. Both are from the gTTS version pinned
+# in requirements.txt; check them again before upgrading it.
+GTTS_AUDIO_RE = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+class GTTSBackend:
+    """
+    Google Translate TTS over a shared keep-alive connection pool.
+
+    gTTS itself opens a new requests.Session, and so a new TCP and TLS connection, for every
+    request. Here gTTS only builds the requests; they are sent over one long-lived session
+    whose pool holds at most pool_size connections and blocks callers beyond that, and the
+    language table is loaded once. api_base (or GTTS_API_BASE) points the requests at a
+    local stand-in instead of translate.google.com.
+    """
+
+    name = "gtts"
+
+    def __init__(self, tts_factory=None, concurrency=GTTS_POOL_SIZE, api_base=None, verify=True):
+        """
+        tts_factory, when given, is called as tts_factory(text=..., lang=..., slow=...) and
+        must return an object with a write_to_fp(fp) method; it is used instead of the pool.
+        """
+        # gtts pulls in requests and its language table; import it only once a backend is built
+        import requests
+        from requests.adapters import HTTPAdapter
+        from gtts import gTTS
+        from gtts.lang import tts_langs
+
+        if tts_factory is None and not callable(getattr(gTTS, "_prepare_requests", None)):
+            raise RuntimeError(
+                "The installed gTTS has no gTTS._prepare_requests(), which GTTSBackend sends through "
+                "its connection pool; install the gTTS version pinned in requirements.txt"
+            )
+        self.tts_factory = tts_factory
+        self.api_base = api_base or os.getenv("GTTS_API_BASE")
+        self.capabilities = BackendCapabilities(
+            languages=frozenset(tts_langs()) | {"iw"},
+            max_bytes=ENGINE_MAX_BYTES["gtts"],
+            concurrency=concurrency,
+            output_format="mp3",
+        )
+        self.session = requests.Session()
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _send(self, prepared):
+        if self.api_base:
+            prepared.url = self.api_base + prepared.path_url
+        return self.session.send(prepared, timeout=GTTS_REQUEST_TIMEOUT)
+
+    def synthesize(self, text, language):
+        from gtts.tts import gTTSError
+
+        if self.tts_factory is not None:
+            tts = self.tts_factory(text=text, lang=language, slow=False)
+            chunk_audio = io.BytesIO()
+            try:
+                tts.write_to_fp(chunk_audio)
+            except gTTSError as e:
+                if "429" in str(e):
+                    raise BackendThrottledError(str(e)) from e
+                raise
+            return chunk_audio.getvalue()
+
+        from gtts import gTTS
+
+        if language not in self.capabilities.languages:
+            raise UnsupportedLanguageError(f"Language not supported by gTTS: {language}")
+        # Checked above against the table loaded once, instead of on every gTTS object
+        tts = gTTS(text=text, lang=language, slow=False, lang_check=False)
+        audio = []
+        for prepared in tts._prepare_requests():
+            response = self._send(prepared)
+            if response.status_code == 429:
+                raise BackendThrottledError(f"429 (Too Many Requests) from {self.name}")
+            if response.status_code != 200:
+                raise gTTSError(tts=tts, response=response)
+            match = GTTS_AUDIO_RE.search(response.text)
+            if match is None:
+                raise gTTSError(tts=tts, response=response)
+            audio.append(base64.b64decode(match.group(1)))
+        return b"".join(audio)
+
+    def close(self):
+        self.session.close()
+
+# One silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, 417 bytes, ~26 ms
+SILENT_MP3_FRAME = bytes.fromhex("fffb90c4") + bytes(413)
+
+class FakeBackend:
+    """
+    Deterministic in-process stand-in for a network TTS service.
+
+    Each request sleeps for latency + per_char_latency * len(text) and returns silent MP3
+    frames proportional to the text length. Whether a request fails or is throttled depends
+    only on the text and how many times it has been requested, so runs are reproducible
+    regardless of scheduling order.
+    """
+
+    def __init__(self, name="fake", languages=("iw", "he", "en"), latency=0.05, per_char_latency=0.0,
+                 failure_rate=0.0, throttle_rate=0.0, max_bytes=5000, concurrency=8, chars_per_frame=4):
+        self.name = name
+        self.latency = latency
+        self.per_char_latency = per_char_latency
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.chars_per_frame = chars_per_frame
+        self.capabilities = BackendCapabilities(
+            languages=frozenset(languages),
+            max_bytes=max_bytes,
+            concurrency=concurrency,
+            output_format="mp3",
+        )
+        self.requests = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def _roll(self, text, attempt, salt):
+        return zlib.crc32(f"{salt}:{attempt}:{text}".encode("utf-8")) / 0xFFFFFFFF
+
+    def synthesize(self, text, language):
+        with self._lock:
+            self.requests += 1
+            attempt = self._attempts.get(text, 0)
+            self._attempts[text] = attempt + 1
+        time.sleep(self.latency + self.per_char_latency * len(text))
+        if self._roll(text, attempt, "throttle") < self.throttle_rate:
+            raise BackendThrottledError(f"429 (Too Many Requests) from {self.name}")
+        if self._roll(text, attempt, "failure") < self.failure_rate:
+            raise ConnectionError(f"Simulated failure from {self.name}")
+        return SILENT_MP3_FRAME * max(1, len(text) // self.chars_per_frame)
+
+class BackendRegistry:
+    """
+    Routes each chunk to the fastest available backend for its language.
+
+    Backends are ranked by a moving average of their observed latency. A backend that
+    throttles is skipped for a cooldown period and the chunk falls through to the next
+    candidate; only when every candidate is throttled does the error reach the caller.
+    Each backend's concurrency limit is enforced here, across every event loop and thread.
+    """
+
+    def __init__(self, backends=(), output_format="mp3", throttle_cooldown=30.0, latency_smoothing=0.2):
+        self.output_format = output_format
+        self.throttle_cooldown = throttle_cooldown
+        self.latency_smoothing = latency_smoothing
+        self._backends = []
+        self._latency = {}
+        self._throttled_until = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+        for backend in backends:
+            self.register(backend)
+
+    def register(self, backend):
+        if backend.capabilities.output_format != self.output_format:
+            # Segments from different containers cannot be joined into one file
+            raise ValueError(f"{backend.name} produces {backend.capabilities.output_format}, not {self.output_format}")
+        self._backends.append(backend)
+        self._latency[backend.name] = 0.0
+        self._throttled_until[backend.name] = 0.0
+        self._slots[backend.name] = threading.BoundedSemaphore(backend.capabilities.concurrency)
+
+    @property
+    def name(self):
+        return "+".join(backend.name for backend in self._backends)
+
+    @property
+    def capabilities(self):
+        return BackendCapabilities(
+            languages=frozenset().union(*(b.capabilities.languages for b in self._backends)),
+            max_bytes=min(b.capabilities.max_bytes for b in self._backends),
+            concurrency=sum(b.capabilities.concurrency for b in self._backends),
+            output_format=self.output_format,
+        )
+
+    def candidates(self, language):
+        now = time.time()
+        with self._lock:
+            available = [b for b in self._backends if language in b.capabilities.languages]
+            return sorted(available, key=lambda b: (self._throttled_until[b.name] > now, self._latency[b.name]))
+
+    def synthesize(self, text, language):
+        candidates = self.candidates(language)
+        if not candidates:
+            raise UnsupportedLanguageError(f"No text to speech backend supports language '{language}'")
+        last_error = None
+        for backend in candidates:
+            try:
+                with self._slots[backend.name]:
+                    start_time = time.perf_counter()
+                    audio = backend.synthesize(text, language)
+                self._record_latency(backend.name, time.perf_counter() - start_time)
+                return audio
+            except BackendThrottledError as e:
+                print(f"Backend {backend.name} throttled, falling back")
+                with self._lock:
+                    self._throttled_until[backend.name] = time.time() + self.throttle_cooldown
+                last_error = e
+        raise last_error
+
+    def _record_latency(self, name, latency):
+        with self._lock:
+            previous = self._latency[name]
+            self._latency[name] = latency if previous == 0 else (
+                self.latency_smoothing * latency + (1 - self.latency_smoothing) * previous
+            )
@@ -1,78 +1,228 @@
 import os
-import io
 import uuid
 import time
 import asyncio
-from gtts import gTTS
-from gtts.lang import tts_langs
-from gtts.tts import gTTSError
-from aiohttp import ClientSession
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_right
+from utils.dedup import chunk_segments
+from utils.metrics import metrics
+from utils.mp3 import SeekableMP3Writer
+from utils.language_detection import detect_chunk_language
+from utils.tts_backends import BackendThrottledError, GTTSBackend, UnsupportedLanguageError
 
 class gTTSTextToSpeechConverter:
-    def __init__(self, upload_dir="uploads"):
+    def __init__(self, upload_dir="uploads", tts_factory=None, audio_cache=None, rate_limiter=None, backend=None):
+        """
+        backend synthesizes single chunks; it is any utils.tts_backends.TTSBackend, such as a
+        BackendRegistry routing between engines or a FakeBackend. By default it is gTTS,
+        built with tts_factory, which is called as tts_factory(text=..., lang=..., slow=...)
+        and must return an object with a write_to_fp(fp) method.
+
+        audio_cache is an optional utils.audio_cache.AudioCache; when given, each chunk
+        is looked up by its content before it is sent to the backend.
+
+        rate_limiter is an optional utils.rate_limiter.AdaptiveRateLimiter; every request
+        waits for a token from it and reports 429s and successes back to it.
+
+        A converter is meant to be long-lived and shared: text_to_speech can run for several
+        documents at once, from any event loop, and backend calls go to one executor sized
+        to the backend's concurrency rather than each loop's default one.
+        """
         self.UPLOAD_DIR = upload_dir
         os.makedirs(self.UPLOAD_DIR, exist_ok=True)
-        self.available_languages = tts_langs()
-        self.session = None
+        self.backend = backend or GTTSBackend(tts_factory)
+        self.available_languages = self.backend.capabilities.languages
+        self.audio_cache = audio_cache
+        self.rate_limiter = rate_limiter
+        self.executor = ThreadPoolExecutor(max_workers=self.backend.capabilities.concurrency, thread_name_prefix=f"tts-{self.backend.name}")
+
+    async def text_to_speech(self, text, language, max_retries=5, initial_delay=2, max_chunk_bytes=None, status_callback=None, max_concurrency=None, segment_callback=None, checkpoint=None, per_chunk_language=False, page_offsets=None):
+        """
+        max_chunk_bytes and max_concurrency default to the backend's capabilities.
+
+        segment_callback, when given, is awaited as segment_callback(index, total, audio_bytes)
+        for every segment in playback order as soon as it is written, so playback can start
+        before the whole document is synthesized.
+
+        checkpoint, when given, is a utils.checkpoint.ConversionCheckpoint. Segments already
+        stored in it are reused and new ones are saved as they finish, so a failed conversion
+        resumes where it stopped; it is discarded once the output file is complete.
 
-    async def text_to_speech(self, text, language, max_retries=5, initial_delay=2, chunk_size=5000, status_callback=None):
+        per_chunk_language labels every chunk separately, so English passages in a Hebrew
+        document are read by an English voice; language is the fallback for unclear chunks.
+
+        The output file carries a Xing header and seek table. page_offsets, when given, is
+        where each PDF page starts in text; every page becomes an ID3 chapter marker.
+        """
         unique_filename = f"{uuid.uuid4()}.mp3"
         file_path = os.path.join(self.UPLOAD_DIR, unique_filename)
 
-        chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-        
-        combined_audio = io.BytesIO()
+        max_chunk_bytes = max_chunk_bytes or self.backend.capabilities.max_bytes
+        max_concurrency = max_concurrency or self.backend.capabilities.concurrency
+
+        # Segments separated by utils.dedup.SEGMENT_SEPARATOR are chunked independently
+        chunks = chunk_segments(text, max_chunk_bytes)
+        total_chunks = len(chunks)
+        # Identical chunks (repeated headers, footers, disclaimers) share one synthesis
+        shared_audio = {}
         
         start_time = time.time()
 
-        self.session = ClientSession()
+        # A slot is held from the moment a chunk starts until its audio has been written
+        # in order, so at most max_concurrency segments are in flight or waiting at once.
+        slots = asyncio.Semaphore(max(1, max_concurrency))
+        finished = {}
+        failures = []
+        state = {"next_index": 0, "done": 0}
+        # (start, duration) in seconds of every segment in the output file
+        segment_times = []
+
+        async def synthesize_chunk(i, chunk):
+            chunk_language = language
+            if per_chunk_language:
+                # langdetect is CPU-bound and loads its profiles on first use; keep it off the loop
+                chunk_language = await asyncio.get_running_loop().run_in_executor(self.executor, self._chunk_language, chunk, language)
+            return await self._process_chunk(chunk, chunk_language, i, total_chunks, max_retries, initial_delay, status_callback)
+
+        async def run_chunk(i, chunk):
+            try:
+                audio = checkpoint.load(i, chunk) if checkpoint is not None else None
+                if audio is None:
+                    if chunk not in shared_audio:
+                        shared_audio[chunk] = asyncio.ensure_future(synthesize_chunk(i, chunk))
+                    audio = await asyncio.shield(shared_audio[chunk])
+                    if checkpoint is not None:
+                        checkpoint.save(i, chunk, audio)
+            except Exception as e:
+                # Wake the scheduler so it notices the failure instead of waiting for a slot
+                failures.append(e)
+                slots.release()
+                raise
+            finished[i] = audio
+            while state["next_index"] in finished:
+                index = state["next_index"]
+                segment = finished.pop(index)
+                with metrics.span("audio_write"):
+                    segment_times.append(output.write_segment(segment))
+                metrics.inc("audio_bytes_written_total", len(segment))
+                state["next_index"] += 1
+                slots.release()
+                if segment_callback:
+                    await segment_callback(index, total_chunks, segment)
+            state["done"] += 1
+            if status_callback:
+                await status_callback(f"הושלמו {state['done']} מתוך {total_chunks} חלקים", state["done"] / total_chunks)
+            print(f"Completed {state['done']} of {total_chunks} chunks")
+
+        # Segments go straight to the output file in order; only the segments waiting for an
+        # earlier one to finish are held in memory, and that is bounded by max_concurrency.
+        output = SeekableMP3Writer(file_path, chapter_count=len(page_offsets or ()))
+        tasks = []
+        completed = False
         try:
             for i, chunk in enumerate(chunks):
-                if status_callback:
-                    await status_callback(f"מעבד חלק {i+1} מתוך {len(chunks)}", (i + 1) / len(chunks))
-                print(f"Processing chunk {i+1} of {len(chunks)}")
-                await self._process_chunk(chunk, language, combined_audio, i, len(chunks), max_retries, initial_delay, status_callback)
-
-            with open(file_path, 'wb') as f:
-                f.write(combined_audio.getvalue())
+                await slots.acquire()
+                task = asyncio.create_task(run_chunk(i, chunk))
+                tasks.append(task)
+                # Surface a failure as soon as it happens instead of after queueing every chunk
+                if failures:
+                    raise failures[0]
+            await asyncio.gather(*tasks)
+            output.finish(self._page_chapters(text, chunks, segment_times, page_offsets or ()))
+            completed = True
+            if checkpoint is not None:
+                checkpoint.discard()
         finally:
-            await self.session.close()
-            self.session = None
+            for task in tasks + list(shared_audio.values()):
+                task.cancel()
+            await asyncio.gather(*tasks, *shared_audio.values(), return_exceptions=True)
+            if not completed:
+                output.close()
+                os.remove(file_path)
 
         end_time = time.time()
         total_time = end_time - start_time
 
         return file_path, total_time
 
-    async def _process_chunk(self, chunk, language, combined_audio, chunk_num, total_chunks, max_retries, initial_delay, status_callback):
+    @staticmethod
+    def _page_chapters(text, chunks, segment_times, page_offsets):
+        """
+        Map each page's offset in text to a time in the output, assuming speech runs at an
+        even pace through the chunk the page starts in.
+        """
+        chunk_starts = []
+        position = 0
+        for chunk in chunks:
+            position = text.find(chunk, position)
+            chunk_starts.append(position)
+            position += len(chunk)
+        chapters = []
+        for page_no, offset in enumerate(page_offsets, start=1):
+            index = max(0, bisect_right(chunk_starts, offset) - 1)
+            start, duration = segment_times[index] if segment_times else (0.0, 0.0)
+            within = min(1.0, max(0.0, (offset - chunk_starts[index]) / max(1, len(chunks[index])))) if chunks else 0.0
+            chapters.append((f"עמוד {page_no}", start + duration * within))
+        return chapters
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if hasattr(self.backend, "close"):
+            self.backend.close()
+
+    def _chunk_language(self, chunk, fallback):
+        chunk_language = detect_chunk_language(chunk, fallback)
+        if chunk_language == 'he' and 'he' not in self.available_languages:
+            chunk_language = 'iw'  # gTTS uses 'iw' for Hebrew
+        return chunk_language if chunk_language in self.available_languages else fallback
+
+    async def _process_chunk(self, chunk, language, chunk_num, total_chunks, max_retries, initial_delay, status_callback):
+        from gtts.tts import gTTSError
+
+        cache_key = None
+        if self.audio_cache is not None:
+            cache_key = self.audio_cache.make_key(chunk, language, self.backend.name, {"slow": False})
+            cached_audio = self.audio_cache.get(cache_key)
+            if cached_audio is not None:
+                return cached_audio
+
         delay = initial_delay
         for attempt in range(max_retries):
             try:
-                tts = gTTS(text=chunk, lang=language, slow=False)
-                
-                chunk_audio = io.BytesIO()
-                await asyncio.get_event_loop().run_in_executor(None, tts.write_to_fp, chunk_audio)
-                chunk_audio.seek(0)
-                
-                combined_audio.write(chunk_audio.getvalue())
-                break
-            except gTTSError as e:
-                if "429" in str(e):
-                    if status_callback:
-                        await status_callback(f"הגבלת קצב API. מנסה שוב חלק {chunk_num + 1} בעוד {delay} שניות...", (chunk_num + 1) / total_chunks)
-                    print(f"Rate limit hit. Retrying chunk {chunk_num + 1} in {delay} seconds...")
-                    await asyncio.sleep(delay)
-                    delay *= 2
-                else:
-                    raise
+                if attempt > 0:
+                    metrics.inc("tts_retries_total", backend=self.backend.name)
+                if self.rate_limiter is not None:
+                    metrics.observe("tts_rate_limit_wait_seconds", await self.rate_limiter.acquire())
+                metrics.inc("tts_requests_total", backend=self.backend.name)
+                with metrics.span("tts_request", backend=self.backend.name):
+                    audio = await asyncio.get_running_loop().run_in_executor(self.executor, self.backend.synthesize, chunk, language)
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.report_success()
+                if cache_key is not None:
+                    self.audio_cache.put(cache_key, audio)
+                return audio
+            except BackendThrottledError:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.report_throttled()
+                if status_callback:
+                    await status_callback(f"הגבלת קצב API. מנסה שוב חלק {chunk_num + 1} בעוד {delay} שניות...", chunk_num / total_chunks)
+                print(f"Rate limit hit. Retrying chunk {chunk_num + 1} in {delay} seconds...")
+                metrics.inc("tts_throttled_total", backend=self.backend.name)
+                metrics.inc("tts_backoff_seconds_total", delay, backend=self.backend.name)
+                await asyncio.sleep(delay)
+                delay *= 2
+            except (gTTSError, UnsupportedLanguageError):
+                raise
             except Exception as e:
                 if status_callback:
-                    await status_callback(f"שגיאה בעיבוד חלק {chunk_num + 1}: {str(e)}", (chunk_num + 1) / total_chunks)
+                    await status_callback(f"שגיאה בעיבוד חלק {chunk_num + 1}: {str(e)}", chunk_num / total_chunks)
                 print(f"Error processing chunk {chunk_num + 1}: {str(e)}")
+                metrics.inc("tts_errors_total", backend=self.backend.name)
                 if attempt == max_retries - 1:
                     raise Exception(f"Failed to convert chunk {chunk_num + 1} to speech after multiple retries")
                 await asyncio.sleep(delay)
                 delay *= 2
+        raise Exception(f"Failed to convert chunk {chunk_num + 1} to speech after multiple retries")
 
 # Usage example
 if __name__ == "__main__":
@@ -2,60 +2,117 @@ import pyttsx3
 import os
 import uuid
 import time
+import wave
 import asyncio
-import streamlit as st
+from concurrent.futures import ProcessPoolExecutor
+from utils.chunker import ENGINE_MAX_BYTES
+from utils.dedup import chunk_segments
+
+# Format of the output when there is nothing to merge (empty text): 16-bit mono at the
+# rate pyttsx3's engines typically produce
+EMPTY_WAV_CHANNELS = 1
+EMPTY_WAV_SAMPLE_WIDTH = 2
+EMPTY_WAV_FRAME_RATE = 22050
+
+# Engine owned by each worker process, initialized once with the voice settings
+_worker_engine = None
+
+def _init_worker(rate, volume, voice_index):
+    global _worker_engine
+    _worker_engine = pyttsx3.init()
+    _worker_engine.setProperty('rate', rate)
+    _worker_engine.setProperty('volume', volume)
+    voices = _worker_engine.getProperty('voices')
+    if voice_index < len(voices):
+        _worker_engine.setProperty('voice', voices[voice_index].id)
+
+def _synthesize_chunk(chunk, temp_filepath):
+    _worker_engine.save_to_file(chunk, temp_filepath)
+    _worker_engine.runAndWait()
+    return temp_filepath
 
 class Pyttsx3TextToSpeechConverter:
-    def __init__(self, upload_dir="uploads"):
-        self.engine = pyttsx3.init()
-        self.engine.setProperty('rate', 150)
-        self.engine.setProperty('volume', 1.0)
-        voices = self.engine.getProperty('voices')
-        self.engine.setProperty('voice', voices[1].id)
-        
+    """
+    Offline text to speech backed by a pool of worker processes, each holding its own
+    pre-initialized pyttsx3 engine. Chunks are synthesized in parallel to separate WAV files
+    and merged at the PCM level into a single valid WAV file.
+    """
+
+    def __init__(self, upload_dir="uploads", workers=None, rate=150, volume=1.0, voice_index=1):
         self.UPLOAD_DIR = upload_dir
         os.makedirs(self.UPLOAD_DIR, exist_ok=True)
-        
-    async def text_to_speech(self, text, language, chunk_size=1000, status_callback=None):
-        unique_filename = f"{uuid.uuid4()}.mp3"
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1,
+            initializer=_init_worker,
+            initargs=(rate, volume, voice_index),
+        )
+
+    async def text_to_speech(self, text, language, max_chunk_bytes=ENGINE_MAX_BYTES["pyttsx3"], status_callback=None):
+        unique_filename = f"{uuid.uuid4()}.wav"
         file_path = os.path.join(self.UPLOAD_DIR, unique_filename)
 
-        # Split the text into chunks
-        chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        # Split the text into chunks of whole sentences
+        chunks = chunk_segments(text, max_chunk_bytes)
 
         start_time = time.time()
 
-        temp_files = []
-        temp_filename = f"{uuid.uuid4()}_chunk"
-        for i, chunk in enumerate(chunks):
-            if status_callback:
-                await status_callback(f"Processing chunk {i+1} of {len(chunks)}", (i + 1) / len(chunks))
-            progress_bar.progress((i + 1) / len(chunks))
-            
-            # Create a temporary file for each chunk with a unique name
-            temp_filename = f"{temp_filename}_{i}.mp3"
-            temp_filepath = os.path.join(self.UPLOAD_DIR, temp_filename)
-            temp_files.append(temp_filepath)
-            
-            self.engine.save_to_file(chunk, temp_filepath)
-            self.engine.runAndWait()
-
-        # Combine all temporary files
-        with open(file_path, 'wb') as outfile:
+        loop = asyncio.get_running_loop()
+        batch_id = uuid.uuid4()
+        temp_files = [os.path.join(self.UPLOAD_DIR, f"{batch_id}_chunk_{i}.wav") for i in range(len(chunks))]
+        futures = [
+            loop.run_in_executor(self.pool, _synthesize_chunk, chunk, temp_filepath)
+            for chunk, temp_filepath in zip(chunks, temp_files)
+        ]
+
+        try:
+            for done, future in enumerate(asyncio.as_completed(futures), start=1):
+                await future
+                if status_callback:
+                    await status_callback(f"Completed {done} of {len(chunks)} chunks", done / len(chunks))
+
+            # Each chunk is a complete WAV file with its own header, so copy only the PCM
+            # frames into one output file whose header covers all of them
+            self._merge_wav_files(temp_files, file_path)
+        finally:
+            for future in futures:
+                future.cancel()
             for temp_file in temp_files:
-                with open(temp_file, 'rb') as infile:
-                    outfile.write(infile.read())
-                os.remove(temp_file)  # Remove temporary file
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)  # Remove temporary file
 
         end_time = time.time()
         total_time = end_time - start_time
-        
-        progress_bar.empty()
 
         return file_path, total_time
+
+    @staticmethod
+    def _merge_wav_files(input_paths, output_path, frames_per_read=65536):
+        with wave.open(output_path, 'wb') as output:
+            params = None
+            for input_path in input_paths:
+                with wave.open(input_path, 'rb') as segment:
+                    if params is None:
+                        params = segment.getparams()
+                        output.setnchannels(params.nchannels)
+                        output.setsampwidth(params.sampwidth)
+                        output.setframerate(params.framerate)
+                    elif (segment.getnchannels(), segment.getsampwidth(), segment.getframerate()) != (
+                        params.nchannels, params.sampwidth, params.framerate
+                    ):
+                        raise ValueError(f"Cannot merge {input_path}: audio format differs from the first chunk")
+                    while True:
+                        frames = segment.readframes(frames_per_read)
+                        if not frames:
+                            break
+                        output.writeframes(frames)
+            if params is None:
+                # No chunks, e.g. an image-only PDF: still write a valid, empty WAV file
+                output.setnchannels(EMPTY_WAV_CHANNELS)
+                output.setsampwidth(EMPTY_WAV_SAMPLE_WIDTH)
+                output.setframerate(EMPTY_WAV_FRAME_RATE)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
     
     async def print_available_voices(self):
         engine = pyttsx3.init()
@@ -74,7 +131,7 @@ class Pyttsx3TextToSpeechConverter:
 if __name__ == "__main__":
     converter = Pyttsx3TextToSpeechConverter()
     
-    text = "This is a test of the text-to-speech conversion system." * 1000  # Long text
+    text = "This is a test of the text-to-speech conversion system. " * 1000  # Long text
     language = "en"
     
     async def print_status(status, progress):
@@ -85,4 +142,7 @@ if __name__ == "__main__":
         print(f"Audio saved to: {file_path}")
         print(f"Conversion time: {total_time:.2f} seconds")
 
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        converter.close()